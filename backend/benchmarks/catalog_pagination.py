@@ -0,0 +1,61 @@
+'''Сравнение задержки глубоких страниц каталога: OFFSET против курсора.
+
+Запуск: DATABASE_URL=... python backend/benchmarks/catalog_pagination.py
+'''
+import argparse
+import json
+import os
+
+import psycopg2
+
+os.environ['RESPONSE_CACHE_MAX_ENTRIES'] = '0'
+
+from common import load_handler, make_event, measure, require_dsn, summarize
+
+
+def cursor_at(dsn, catalog, offset):
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(
+        '''SELECT created_at, id FROM products WHERE is_active = true
+           ORDER BY created_at DESC, id DESC LIMIT 1 OFFSET %s''',
+        (offset - 1,)
+    )
+    row = cur.fetchone()
+    cur.close()
+    conn.close()
+    return catalog.encode_cursor(row[0], row[1]) if row else None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', default='1,50,200,400,600')
+    parser.add_argument('--limit', type=int, default=24)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    dsn = require_dsn()
+    catalog = load_handler('catalog')
+    results = []
+
+    for page in [int(x) for x in args.pages.split(',')]:
+        limit = str(args.limit)
+        offset_event = make_event(params={'page': str(page), 'limit': limit})
+        offset_samples = measure(lambda: catalog.handler(offset_event, None), args.repeat)
+
+        row = {'page': page, 'offset': summarize(offset_samples)}
+
+        if page > 1:
+            cursor = cursor_at(dsn, catalog, (page - 1) * args.limit)
+            if cursor:
+                cursor_event = make_event(params={'cursor': cursor, 'limit': limit})
+                cursor_samples = measure(lambda: catalog.handler(cursor_event, None), args.repeat)
+                row['cursor'] = summarize(cursor_samples)
+
+        results.append(row)
+
+    print(json.dumps({'benchmark': 'catalog_pagination', 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+'''Холодный старт функций: время импорта и первого вызова в свежем процессе.
+
+Для каждой функции запускается отдельный интерпретатор с -X importtime:
+импорт index.py, затем первый вызов OPTIONS и 405. Фиксируется суммарное
+время импорта, время первого вызова и то, загрузился ли драйвер БД.
+Как и при деплое, в sys.path только каталог функции, так что пакет shared
+берётся из её собственной копии; перед замером копии сверяются с
+backend/shared/. База данных не нужна.
+
+Запуск: python backend/benchmarks/cold_start.py [--repeat 5]
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from common import BACKEND_DIR
+
+FUNCTIONS = ['catalog', 'metadata', 'services', 'items', 'orders', 'payment', 'payment-status', 'seed-data']
+
+PROBE = '''
+import json, os, sys, time
+started = time.perf_counter()
+import index
+import shared
+imported = time.perf_counter()
+preflight = index.handler({'httpMethod': 'OPTIONS'}, None)
+first_call = time.perf_counter()
+rejected = index.handler({'httpMethod': 'DELETE'}, None)
+second_call = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'preflight_ms': (first_call - imported) * 1000,
+    'not_allowed_ms': (second_call - first_call) * 1000,
+    'statuses': [preflight['statusCode'], rejected['statusCode']],
+    'driver_loaded': 'psycopg2' in sys.modules,
+    'shared_bundled': shared.__file__.startswith(os.getcwd() + os.sep),
+    'modules': len(sys.modules)
+}))
+'''
+
+
+def import_total_us(stderr):
+    '''Сумма self-времени из вывода -X importtime, микросекунды'''
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        total += int(line.split(':', 1)[1].split('|')[0].strip())
+    return total
+
+
+def probe(function_name):
+    env = {key: value for key, value in os.environ.items() if key != 'PYTHONPATH'}
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE],
+        cwd=os.path.join(BACKEND_DIR, function_name),
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    sample = json.loads(result.stdout.strip().splitlines()[-1])
+    sample['importtime_total_ms'] = import_total_us(result.stderr) / 1000
+    return sample
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    subprocess.run([sys.executable, os.path.join(BACKEND_DIR, 'sync_shared.py'), '--check'], check=True)
+
+    results = {}
+    for function_name in FUNCTIONS:
+        samples = [probe(function_name) for _ in range(args.repeat)]
+        results[function_name] = {
+            'import_ms': round(statistics.median(s['import_ms'] for s in samples), 3),
+            'importtime_total_ms': round(statistics.median(s['importtime_total_ms'] for s in samples), 3),
+            'preflight_ms': round(statistics.median(s['preflight_ms'] for s in samples), 3),
+            'not_allowed_ms': round(statistics.median(s['not_allowed_ms'] for s in samples), 3),
+            'statuses': samples[0]['statuses'],
+            'driver_loaded': any(s['driver_loaded'] for s in samples),
+            'shared_bundled': all(s['shared_bundled'] for s in samples),
+            'modules': samples[0]['modules']
+        }
+
+    print(json.dumps({'benchmark': 'cold_start', 'python': sys.version.split()[0], 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
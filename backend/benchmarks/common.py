@@ -0,0 +1,67 @@
+import importlib.util
+import json
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# Все события бенчмарков приходят с одного IP; лимит по клиенту им не нужен
+os.environ.setdefault('RATE_LIMIT_PER_SECOND', '0')
+
+
+def load_handler(function_name):
+    '''Загрузить handler функции из backend/<function_name>/index.py'''
+    path = os.path.join(BACKEND_DIR, function_name, 'index.py')
+    module_name = f'bench_{function_name.replace("-", "_")}'
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_event(method='GET', params=None, body=None, headers=None):
+    return {
+        'httpMethod': method,
+        'queryStringParameters': params or {},
+        'headers': headers or {},
+        'body': json.dumps(body) if body is not None else None,
+        'requestContext': {'identity': {'sourceIp': '127.0.0.1'}}
+    }
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples):
+    '''p50/p95/p99 в миллисекундах'''
+    return {
+        'n': len(samples),
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3)
+    }
+
+
+def measure(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def require_dsn():
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        sys.exit('DATABASE_URL not configured')
+    return dsn
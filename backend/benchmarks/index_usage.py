@@ -0,0 +1,111 @@
+'''Проверка планов: страницы каталога и услуг идут по ожидаемым индексам.
+
+SQL строится теми же функциями, что и в обработчиках (build_filters и
+page_query в catalog и services), с точным total по умолчанию. Для каждой
+формы запроса выполняется EXPLAIN (FORMAT JSON) и проверяется выборка
+страницы: в ней нет Seq Scan по products/services и использован один из
+ожидаемых индексов. План подсчёта total (InitPlan) только выводится: для
+широких фильтров полный проход по таблице для него нормален.
+Рассчитано на засеянные данные (seed-data, 15000/1000) после ANALYZE.
+Код возврата 1, если хоть одна форма не прошла проверку.
+
+Запуск: DATABASE_URL=... python backend/benchmarks/index_usage.py
+'''
+import json
+import sys
+from datetime import datetime
+from decimal import Decimal
+
+import psycopg2
+
+from common import load_handler, require_dsn
+
+CHECKED_RELATIONS = ('products', 'services')
+
+LAST_ID = 2 ** 31 - 1
+
+# (название, параметры запроса, сортировка, курсор, допустимые индексы страницы)
+CATALOG_CASES = [
+    ('first page', {}, 'newest', None, {'idx_products_active_created_id'}),
+    ('cursor page', {}, 'newest', (datetime(2100, 1, 1), LAST_ID), {'idx_products_active_created_id'}),
+    ('category', {'categories': '1'}, 'newest', None, {'idx_products_active_category_created'}),
+    ('brand', {'brands': '1'}, 'newest', None, {'idx_products_active_brand_created'}),
+    ('category and brand', {'categories': '1', 'brands': '1'}, 'newest', None,
+     {'idx_products_active_category_created', 'idx_products_active_brand_created'}),
+    ('narrow price range', {'min_price': '1000', 'max_price': '1200'}, 'newest', None, {'idx_products_active_price'}),
+    ('price_asc', {}, 'price_asc', None, {'idx_products_active_price'}),
+    ('price_desc cursor', {}, 'price_desc', (Decimal('5000'), LAST_ID), {'idx_products_active_price'}),
+    ('rating', {}, 'rating', None, {'idx_products_active_rating_id'}),
+    ('category by price', {'categories': '1'}, 'price_asc', None, {'idx_products_active_category_price'}),
+    ('category by rating', {'categories': '1'}, 'rating', None, {'idx_products_active_category_rating'}),
+    ('specs', {'specs': '8MP,PTZ'}, 'newest', None, {'idx_products_specs'}),
+    ('search', {'search': 'камера'}, 'relevance', None, {'idx_products_search_vector', 'idx_products_name_trgm'}),
+]
+
+# (название, категория, поиск, допустимые индексы страницы)
+SERVICES_CASES = [
+    ('first page', '', '', {'idx_services_active_category_price_id'}),
+    ('category', 'installation', '', {'idx_services_active_category_price_id'}),
+    ('search', '', 'монтаж', {'idx_services_search_vector', 'idx_services_name_trgm'}),
+]
+
+
+def walk(plan, init_plan=False):
+    '''Узлы плана с признаком «внутри InitPlan» (подсчёт total)'''
+    init_plan = init_plan or plan.get('Parent Relationship') == 'InitPlan'
+    yield plan, init_plan
+    for child in plan.get('Plans', []):
+        yield from walk(child, init_plan)
+
+
+def check(cur, query, values, expected):
+    cur.execute('EXPLAIN (FORMAT JSON) ' + query, values)
+    plan = cur.fetchone()[0][0]['Plan']
+    seq_scans = []
+    indexes = []
+    count_nodes = []
+    for node, init_plan in walk(plan):
+        if init_plan:
+            count_nodes.append(node.get('Index Name') or node.get('Relation Name') or node['Node Type'])
+            continue
+        if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in CHECKED_RELATIONS:
+            seq_scans.append(node['Relation Name'])
+        if 'Index Name' in node:
+            indexes.append(node['Index Name'])
+    return {
+        'ok': not seq_scans and bool(expected & set(indexes)),
+        'expected': sorted(expected),
+        'indexes': indexes,
+        'seq_scans': seq_scans,
+        'count_plan': count_nodes
+    }
+
+
+def main():
+    catalog = load_handler('catalog')
+    services = load_handler('services')
+    conn = psycopg2.connect(require_dsn())
+    cur = conn.cursor()
+
+    results = []
+    for name, params, sort, after, expected in CATALOG_CASES:
+        conditions, values = catalog.build_filters(params)
+        query, query_values = catalog.page_query(conditions, values, sort, params.get('search', ''),
+                                                 catalog.DEFAULT_LIMIT, after=after, with_total=after is None)
+        results.append({'case': f'catalog: {name}', **check(cur, query, query_values, expected)})
+    for name, category, search, expected in SERVICES_CASES:
+        conditions, values = services.build_filters(category, search)
+        query, query_values = services.page_query(conditions, values, search, services.DEFAULT_LIMIT, 0,
+                                                  with_total=True)
+        results.append({'case': f'services: {name}', **check(cur, query, query_values, expected)})
+    cur.close()
+    conn.close()
+
+    failed = [r['case'] for r in results if not r['ok']]
+    print(json.dumps({'benchmark': 'index_usage', 'results': results, 'failed': failed}, indent=2, ensure_ascii=False))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
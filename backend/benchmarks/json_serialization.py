@@ -0,0 +1,130 @@
+'''Сериализация страницы каталога на 24/100/500 строк.
+
+Без базы сравнивается только Python-часть на синтетических строках:
+  legacy      — словарь на строку + json.dumps (прежний код каталога);
+  orjson      — словарь на строку + orjson, если он установлен;
+  passthrough — склейка готовых JSON-строк из Postgres (текущий код).
+С DATABASE_URL дополнительно меряется полный путь запрос+сериализация для
+прежнего списка колонок и для json_build_object.
+
+Запуск: python backend/benchmarks/json_serialization.py
+'''
+import argparse
+import json
+import os
+from datetime import datetime
+from decimal import Decimal
+
+from common import load_handler, measure, summarize
+
+from shared import runtime
+
+LEGACY_COLUMNS = '''p.id, p.name, p.price, p.image_url, p.rating, p.specs, p.stock_quantity,
+    c.name, c.id, b.name, b.id, p.created_at'''
+
+
+def synthetic_rows(count):
+    return [
+        (i, f'IP-камера Hikvision DS-{i} 4MP', Decimal('12345.00'), None, Decimal('4.70'),
+         ['4MP', 'Купол', 'IP54'], 42, 'Видеокамеры', 1, 'Hikvision', 1, datetime(2024, 1, 1))
+        for i in range(count)
+    ]
+
+
+def legacy_dicts(rows):
+    products = []
+    for row in rows:
+        products.append({
+            'id': row[0],
+            'name': row[1],
+            'price': float(row[2]),
+            'image': row[3] or '/placeholder.svg',
+            'rating': float(row[4]) if row[4] else 0,
+            'specs': row[5] or [],
+            'stock': row[6],
+            'category': row[7],
+            'category_id': row[8],
+            'brand': row[9],
+            'brand_id': row[10]
+        })
+    return products
+
+
+def legacy_body(rows):
+    return json.dumps({'products': legacy_dicts(rows), 'total': len(rows), 'page': 1, 'limit': len(rows)})
+
+
+def orjson_body(rows):
+    return runtime.orjson.dumps({'products': legacy_dicts(rows), 'total': len(rows), 'page': 1, 'limit': len(rows)}).decode('utf-8')
+
+
+def passthrough_body(json_rows):
+    products = '[' + ','.join(json_rows) + ']'
+    return runtime.json_response(200, {'total': len(json_rows), 'page': 1, 'limit': len(json_rows)}, raw={'products': products})['body']
+
+
+def python_only(sizes, repeat):
+    results = []
+    for size in sizes:
+        rows = synthetic_rows(size)
+        json_rows = [json.dumps(p, ensure_ascii=False) for p in legacy_dicts(rows)]
+        row = {
+            'rows': size,
+            'legacy': summarize(measure(lambda: legacy_body(rows), repeat)),
+            'passthrough': summarize(measure(lambda: passthrough_body(json_rows), repeat))
+        }
+        if runtime.orjson is not None:
+            row['orjson'] = summarize(measure(lambda: orjson_body(rows), repeat))
+        results.append(row)
+    return results
+
+
+def with_database(dsn, sizes, repeat):
+    import psycopg2
+
+    catalog = load_handler('catalog')
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    base = '''FROM products p
+        LEFT JOIN categories c ON p.category_id = c.id
+        LEFT JOIN brands b ON p.brand_id = b.id
+        WHERE p.is_active = true ORDER BY p.created_at DESC, p.id DESC LIMIT %s'''
+
+    def legacy(size):
+        cur.execute(f'SELECT {LEGACY_COLUMNS} {base}', (size,))
+        return legacy_body(cur.fetchall())
+
+    def passthrough(size):
+        cur.execute(f'SELECT {catalog.PRODUCT_JSON} {base}', (size,))
+        return passthrough_body([row[0] for row in cur.fetchall()])
+
+    results = []
+    for size in sizes:
+        results.append({
+            'rows': size,
+            'legacy': summarize(measure(lambda: legacy(size), repeat)),
+            'passthrough': summarize(measure(lambda: passthrough(size), repeat))
+        })
+    cur.close()
+    conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='24,100,500')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    sizes = [int(x) for x in args.sizes.split(',')]
+    output = {'benchmark': 'json_serialization', 'python_only': python_only(sizes, args.repeat)}
+
+    dsn = os.environ.get('DATABASE_URL')
+    if dsn:
+        output['with_database'] = with_database(dsn, sizes, max(10, args.repeat // 10))
+
+    print(json.dumps(output, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+'''Точный total в листингах каталога и услуг: три варианта SQL на одних данных.
+
+baseline — прежние два запроса: COUNT(*) по отфильтрованной выборке и страница;
+window — одна выборка с COUNT(*) OVER() над полными строками страницы;
+current — запрос обработчика (page_query): страница и COUNT(*) по id во
+внутреннем запросе, JSON и соединения только для строк страницы.
+
+Для каждой формы фильтра сверяются total и id страницы с baseline. Код
+возврата 1, если они расходятся или p50 current хуже p50 baseline больше
+чем на --tolerance.
+
+Запуск: DATABASE_URL=... python backend/benchmarks/listing_total.py
+'''
+import argparse
+import json
+import os
+import sys
+
+import psycopg2
+
+os.environ['RESPONSE_CACHE_MAX_ENTRIES'] = '0'
+
+from common import load_handler, measure, require_dsn, summarize
+
+CATALOG_SHAPES = {
+    'default': {},
+    'category': {'categories': '1'},
+    'brand': {'brands': '1'},
+    'price_range': {'min_price': '1000', 'max_price': '50000'},
+    'search': {'search': 'камера'},
+    'page_5': {'page': '5'}
+}
+
+SERVICES_SHAPES = {
+    'default': {},
+    'category': {'category': 'installation'},
+    'search': {'search': 'монтаж'}
+}
+
+
+def catalog_variants(catalog, params):
+    search = params.get('search', '')
+    sort = 'relevance' if search else 'newest'
+    limit = catalog.DEFAULT_LIMIT
+    offset = (int(params.get('page', 1)) - 1) * limit
+    conditions, filter_values = catalog.build_filters(params)
+    sort_key, direction, _ = catalog.SORTS[sort]
+    sort_values = [search, search] if sort == 'relevance' else []
+    source = f'''
+        FROM products p
+        LEFT JOIN categories c ON p.category_id = c.id
+        LEFT JOIN brands b ON p.brand_id = b.id
+        WHERE {' AND '.join(['p.is_active = true'] + conditions)}
+    '''
+    page = f'{source} ORDER BY sort_key {direction}, p.id {direction} LIMIT %s OFFSET %s'
+    page_values = sort_values + filter_values + [limit + 1, offset]
+    current, current_values = catalog.page_query(conditions, filter_values, sort, search, limit, offset,
+                                                 with_total=True)
+    return {
+        'baseline': [
+            (f'SELECT COUNT(*) FROM (SELECT p.id {source}) filtered', filter_values),
+            (f'SELECT {catalog.PRODUCT_JSON}, {sort_key} as sort_key, p.id {page}', page_values)
+        ],
+        'window': [
+            (f'SELECT {catalog.PRODUCT_JSON}, {sort_key} as sort_key, p.id, COUNT(*) OVER() {page}', page_values)
+        ],
+        'current': [(current, current_values)]
+    }
+
+
+def services_variants(services, params):
+    search = params.get('search', '')
+    category = params.get('category', '')
+    limit = services.DEFAULT_LIMIT
+    conditions, filter_values = services.build_filters(category, search)
+    source = 'FROM services WHERE ' + ' AND '.join(conditions)
+    if search:
+        order_by = f'ORDER BY {services.SEARCH_RANK} DESC, category, price, id LIMIT %s OFFSET %s'
+        page_values = filter_values + [search, search, limit, 0]
+    else:
+        order_by = 'ORDER BY category, price, id LIMIT %s OFFSET %s'
+        page_values = filter_values + [limit, 0]
+    columns = 'id, name, description, price, category, duration_hours'
+    current, current_values = services.page_query(conditions, filter_values, search, limit, 0, with_total=True)
+    return {
+        'baseline': [
+            (f'SELECT COUNT(*) FROM (SELECT id {source}) filtered', filter_values),
+            (f'SELECT {columns} {source} {order_by}', page_values)
+        ],
+        'window': [(f'SELECT {columns}, COUNT(*) OVER() {source} {order_by}', page_values)],
+        'current': [(current, current_values)]
+    }
+
+
+def run(cur, statements):
+    return [(cur.execute(query, values), cur.fetchall())[1] for query, values in statements]
+
+
+def page_result(variant, results, id_column):
+    '''(total, id страницы) из результатов варианта'''
+    if variant == 'baseline':
+        total, rows = results[0][0][0], results[1]
+    else:
+        rows = results[0]
+        total = rows[0][-1] if rows else 0
+    return total, [row[id_column] for row in rows]
+
+
+def compare(cur, variants, id_column, repeat, tolerance):
+    for statements in variants.values():
+        run(cur, statements)
+
+    results = {name: summarize(measure(lambda: run(cur, statements), repeat)) for name, statements in variants.items()}
+    expected = page_result('baseline', run(cur, variants['baseline']), id_column)
+    problems = []
+    for name in ('window', 'current'):
+        if page_result(name, run(cur, variants[name]), id_column) != expected:
+            problems.append(f'{name} result differs from baseline')
+    if results['current']['p50_ms'] > results['baseline']['p50_ms'] * (1 + tolerance):
+        problems.append('current slower than baseline')
+    return {**results, 'total': expected[0], 'problems': problems}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    args = parser.parse_args()
+
+    dsn = require_dsn()
+    catalog = load_handler('catalog')
+    services = load_handler('services')
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+
+    results = {'catalog': {}, 'services': {}}
+    for shape, params in CATALOG_SHAPES.items():
+        results['catalog'][shape] = compare(cur, catalog_variants(catalog, params), 2, args.repeat, args.tolerance)
+    for shape, params in SERVICES_SHAPES.items():
+        results['services'][shape] = compare(cur, services_variants(services, params), 0, args.repeat, args.tolerance)
+
+    cur.close()
+    conn.close()
+
+    failed = [f'{function_name}.{shape}' for function_name, shapes in results.items()
+              for shape, result in shapes.items() if result['problems']]
+    print(json.dumps({'benchmark': 'listing_total', 'results': results, 'failed': failed}, indent=2, ensure_ascii=False))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
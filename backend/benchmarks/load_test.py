@@ -0,0 +1,228 @@
+'''Нагрузочный прогон всех обработчиков на засеянной базе (seed-data).
+
+Обработчики импортируются напрямую и вызываются параллельно из пула потоков
+или процессов. Для каждой функции строится смесь событий: поисковые
+запросы, комбинации фильтров, глубокие страницы, корзины разного размера.
+По каждой функции выводятся requests/sec, p50/p95/p99 и коды ответов в JSON,
+который удобно сравнивать между коммитами (--output results.json).
+
+По умолчанию кэш ответов отключён (--cache off), чтобы мерить путь до базы.
+payment создаёт настоящие заказы и ходит в локальную заглушку ЮKassa,
+поэтому включается только флагом --with-payment.
+
+Запуск: DATABASE_URL=... python backend/benchmarks/load_test.py [--pool process]
+'''
+import argparse
+import json
+import os
+import random
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from common import BACKEND_DIR, load_handler, make_event, require_dsn, summarize
+
+SEARCH_TERMS = ['камера', 'Hikvision', 'шлагбаум', 'DS-2', 'привод ворот', 'кабель UTP', 'датчик дымовой', 'установка']
+CART_SIZES = [1, 5, 20, 100]
+DEFAULT_ENDPOINTS = ['catalog', 'metadata', 'services', 'items']
+
+_handlers = {}
+
+
+def run_batch(function_name, events):
+    '''Выполнить пачку событий в текущем потоке/процессе; вернуть [(секунды, статус)]'''
+    module = _handlers.get(function_name)
+    if module is None:
+        module = _handlers[function_name] = load_handler(function_name)
+    samples = []
+    for event in events:
+        started = time.perf_counter()
+        response = module.handler(event, None)
+        samples.append((time.perf_counter() - started, response['statusCode']))
+    return samples
+
+
+def dataset(dsn):
+    '''Идентификаторы из засеянной базы для построения событий'''
+    import psycopg2
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute('SELECT id FROM categories')
+    category_ids = [row[0] for row in cur.fetchall()]
+    cur.execute('SELECT id FROM brands')
+    brand_ids = [row[0] for row in cur.fetchall()]
+    cur.execute('SELECT id, price FROM products WHERE is_active = true LIMIT 5000')
+    products = cur.fetchall()
+    cur.execute('SELECT id, category FROM services WHERE is_active = true')
+    services = cur.fetchall()
+    cur.close()
+    conn.close()
+    return {
+        'category_ids': category_ids,
+        'brand_ids': brand_ids,
+        'products': [(row[0], float(row[1])) for row in products],
+        'service_ids': [row[0] for row in services],
+        'service_categories': sorted({row[1] for row in services})
+    }
+
+
+def catalog_event(rng, data):
+    kind = rng.choice(['first', 'search', 'category', 'combo', 'deep', 'facets', 'estimate'])
+    params = {'page': '1', 'limit': '24'}
+    if kind == 'search':
+        params['search'] = rng.choice(SEARCH_TERMS)
+    elif kind == 'category':
+        params['categories'] = str(rng.choice(data['category_ids']))
+    elif kind == 'combo':
+        params['categories'] = ','.join(str(i) for i in rng.sample(data['category_ids'], 2))
+        params['brands'] = ','.join(str(i) for i in rng.sample(data['brand_ids'], 3))
+        low = rng.choice([0, 1000, 5000, 20000])
+        params['min_price'] = str(low)
+        params['max_price'] = str(low + rng.choice([5000, 20000, 100000]))
+    elif kind == 'deep':
+        params['page'] = str(rng.randint(100, 600))
+    elif kind == 'facets':
+        params['facets'] = '1'
+    elif kind == 'estimate':
+        params['page'] = str(rng.randint(1, 50))
+        params['include_total'] = 'estimate'
+    return make_event(params=params)
+
+
+def metadata_event(rng, data):
+    return make_event()
+
+
+def services_event(rng, data):
+    kind = rng.choice(['first', 'category', 'search', 'page'])
+    params = {}
+    if kind == 'category':
+        params['category'] = rng.choice(data['service_categories'])
+    elif kind == 'search':
+        params['search'] = rng.choice(SEARCH_TERMS)
+    elif kind == 'page':
+        params['page'] = str(rng.randint(2, 20))
+    return make_event(params=params)
+
+
+def items_event(rng, data):
+    size = rng.choice(CART_SIZES)
+    ids = [row[0] for row in rng.sample(data['products'], min(size, len(data['products'])))]
+    params = {'ids': ','.join(str(i) for i in ids)}
+    if data['service_ids'] and rng.random() < 0.5:
+        params['service_ids'] = ','.join(str(i) for i in rng.sample(data['service_ids'], min(2, len(data['service_ids']))))
+    return make_event(params=params)
+
+
+def payment_event(rng, data):
+    size = rng.choice(CART_SIZES)
+    lines = rng.sample(data['products'], min(size, len(data['products'])))
+    items = [{'productId': product_id, 'quantity': rng.randint(1, 3)} for product_id, _ in lines]
+    total = sum(price * item['quantity'] for (_, price), item in zip(lines, items))
+    return make_event('POST', body={
+        'customerName': 'Load Test',
+        'customerEmail': 'load@example.com',
+        'customerPhone': '',
+        'items': items,
+        'totalAmount': round(total, 2)
+    })
+
+
+EVENT_BUILDERS = {
+    'catalog': catalog_event,
+    'metadata': metadata_event,
+    'services': services_event,
+    'items': items_event,
+    'payment': payment_event
+}
+
+
+def run_endpoint(executor, function_name, events, concurrency):
+    chunk = max(1, len(events) // (concurrency * 4))
+    batches = [events[i:i + chunk] for i in range(0, len(events), chunk)]
+
+    started = time.perf_counter()
+    futures = [executor.submit(run_batch, function_name, batch) for batch in batches]
+    samples = [sample for future in futures for sample in future.result()]
+    elapsed = time.perf_counter() - started
+
+    statuses = {}
+    for _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        **summarize([s[0] for s in samples]),
+        'requests_per_sec': round(len(samples) / elapsed, 1),
+        'errors': sum(1 for _, status in samples if status >= 500),
+        'statuses': statuses
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--endpoints', default=','.join(DEFAULT_ENDPOINTS))
+    parser.add_argument('--requests', type=int, default=500, help='запросов на функцию')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--pool', choices=['thread', 'process'], default='thread')
+    parser.add_argument('--cache', choices=['on', 'off'], default='off')
+    parser.add_argument('--with-payment', action='store_true')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    dsn = require_dsn()
+    endpoints = [name for name in args.endpoints.split(',') if name]
+    stub = None
+    if args.with_payment:
+        from yookassa_stub import StubProvider
+        stub = StubProvider().start()
+        os.environ.update({'YOOKASSA_API_URL': stub.url, 'YOOKASSA_SHOP_ID': 'load', 'YOOKASSA_SECRET_KEY': 'load'})
+        if 'payment' not in endpoints:
+            endpoints.append('payment')
+    if args.cache == 'off':
+        os.environ['RESPONSE_CACHE_MAX_ENTRIES'] = '0'
+        os.environ['ITEMS_CACHE_TTL'] = '0'
+    os.environ.setdefault('DB_POOL_MAX', str(max(args.concurrency, 10)))
+
+    rng = random.Random(args.seed)
+    data = dataset(dsn)
+    pool_class = ThreadPoolExecutor if args.pool == 'thread' else ProcessPoolExecutor
+
+    results = {}
+    with pool_class(max_workers=args.concurrency) as executor:
+        for function_name in endpoints:
+            events = [EVENT_BUILDERS[function_name](rng, data) for _ in range(args.requests)]
+            run_endpoint(executor, function_name, events[:args.concurrency * 2], args.concurrency)
+            results[function_name] = run_endpoint(executor, function_name, events, args.concurrency)
+
+    if stub is not None:
+        stub.stop()
+
+    output = json.dumps({
+        'benchmark': 'load_test',
+        'revision': git_revision(),
+        'config': {
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'pool': args.pool,
+            'cache': args.cache,
+            'seed': args.seed
+        },
+        'results': results
+    }, indent=2, sort_keys=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+'''Запись заказа: построчные INSERT против одного запроса на заказ и позиции.
+
+Каждая итерация выполняется в транзакции, которая затем откатывается.
+
+Запуск: DATABASE_URL=... python backend/benchmarks/order_write.py
+'''
+import argparse
+import json
+import random
+import uuid
+
+import psycopg2
+
+from common import load_handler, measure, require_dsn, summarize
+
+
+def legacy_write(cur, lines):
+    cur.execute(
+        '''INSERT INTO orders (order_number, customer_name, customer_email, customer_phone, total_amount, status, payment_status)
+           VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id''',
+        (f'BENCH-{uuid.uuid4().hex[:12]}', 'Bench', 'bench@example.com', '', 1, 'pending', 'pending')
+    )
+    order_id = cur.fetchone()[0]
+    for product_id, service_id, quantity in lines:
+        cur.execute(
+            'INSERT INTO order_items (order_id, product_id, service_id, quantity, price) VALUES (%s, %s, %s, %s, %s)',
+            (order_id, product_id, service_id, quantity, 1000)
+        )
+
+
+def batched_write(payment, cur, lines):
+    priced, missing = payment.price_lines(cur, lines)
+    total = sum(line[3] * line[2] for line in priced)
+    payment.write_order(cur, f'BENCH-{uuid.uuid4().hex[:12]}', ('Bench', 'bench@example.com', ''), priced, total)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='1,50,500')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    dsn = require_dsn()
+    payment = load_handler('payment')
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute('SELECT id FROM products WHERE is_active = true LIMIT 5000')
+    product_ids = [row[0] for row in cur.fetchall()]
+
+    def run(write, lines):
+        write(lines)
+        conn.rollback()
+
+    results = []
+    for size in [int(x) for x in args.sizes.split(',')]:
+        lines = [(random.choice(product_ids), None, random.randint(1, 5)) for _ in range(size)]
+        results.append({
+            'items': size,
+            'legacy': summarize(measure(lambda: run(lambda l: legacy_write(cur, l), lines), args.repeat)),
+            'batched': summarize(measure(lambda: run(lambda l: batched_write(payment, cur, l), lines), args.repeat))
+        })
+
+    cur.close()
+    conn.close()
+    print(json.dumps({'benchmark': 'order_write', 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+'''Задержка создания платежа при параллельных оформлениях заказа.
+
+Сравнивает прежний urllib.request.urlopen на каждый заказ с пулом keep-alive
+соединений shared.yookassa против локальной заглушки провайдера. База данных
+не нужна. Дополнительно проверяет, что повтор после 503 идёт с тем же
+Idempotence-Key и не создаёт второй платёж.
+
+Запуск: python backend/benchmarks/payment_gateway.py
+'''
+import argparse
+import json
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from common import summarize
+from yookassa_stub import StubProvider
+
+from shared import yookassa
+
+PAYLOAD = {'amount': {'value': '1000.00', 'currency': 'RUB'}, 'capture': True, 'description': 'bench'}
+
+
+def legacy_create(url):
+    req = urllib.request.Request(
+        f'{url}/payments',
+        data=json.dumps(PAYLOAD).encode('utf-8'),
+        headers={'Content-Type': 'application/json', 'Idempotence-Key': str(uuid.uuid4())}
+    )
+    with urllib.request.urlopen(req) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+def run_concurrent(fn, requests, concurrency):
+    def timed(_):
+        started = time.perf_counter()
+        fn()
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = list(executor.map(timed, range(requests)))
+    elapsed = time.perf_counter() - started
+    return {**summarize(samples), 'requests_per_sec': round(requests / elapsed, 1)}
+
+
+def check_retry_reuses_key():
+    stub = StubProvider(fail_first=2).start()
+    client = yookassa.YooKassaClient('shop', 'secret', api_url=stub.url, backoff=0.01)
+    payment = client.create_payment(PAYLOAD, 'retry-key')
+    client.close()
+    stub.stop()
+    return {'requests': stub.requests, 'payments': len(stub.payments), 'ok': payment['id'] == stub.by_key['retry-key']}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0.01)
+    args = parser.parse_args()
+
+    stub = StubProvider(latency=args.latency).start()
+    client = yookassa.YooKassaClient('shop', 'secret', api_url=stub.url, pool_size=args.concurrency)
+
+    results = {
+        'legacy_urlopen': run_concurrent(lambda: legacy_create(stub.url), args.requests, args.concurrency)
+    }
+    legacy_connections = stub.connections
+    results['pooled_client'] = run_concurrent(
+        lambda: client.create_payment(PAYLOAD, str(uuid.uuid4())), args.requests, args.concurrency
+    )
+    results['legacy_urlopen']['connections'] = legacy_connections
+    results['pooled_client']['connections'] = stub.connections - legacy_connections
+    results['pooled_client']['client'] = client.stats()
+
+    client.close()
+    stub.stop()
+
+    print(json.dumps({
+        'benchmark': 'payment_gateway',
+        'concurrency': args.concurrency,
+        'provider_latency_ms': args.latency * 1000,
+        'results': results,
+        'retry_check': check_retry_reuses_key()
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
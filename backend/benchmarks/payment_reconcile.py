@@ -0,0 +1,84 @@
+'''Сверка зависших pending-заказов против локальной заглушки провайдера.
+
+Создаёт тестовые заказы с платежами в заглушке, прогоняет reconcile() и
+проверяет, что статусы записаны, а повторный прогон ничего не меняет.
+
+Запуск: DATABASE_URL=... python backend/benchmarks/payment_reconcile.py
+'''
+import argparse
+import json
+import time
+import uuid
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from common import load_handler, require_dsn
+from yookassa_stub import StubProvider
+
+from shared import yookassa
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.005)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    dsn = require_dsn()
+    module = load_handler('payment-status')
+    stub = StubProvider(latency=args.latency).start()
+    client = yookassa.YooKassaClient('shop', 'secret', api_url=stub.url, pool_size=args.concurrency)
+
+    payment_ids = [stub.create(None, {'amount': {'value': '1.00', 'currency': 'RUB'}})['id'] for _ in range(args.orders)]
+    for i, payment_id in enumerate(payment_ids):
+        stub.statuses[payment_id] = 'canceled' if i % 4 == 0 else 'succeeded'
+
+    prefix = f'BENCH-{uuid.uuid4().hex[:6]}'
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    execute_values(
+        cur,
+        '''INSERT INTO orders (order_number, total_amount, status, payment_status, payment_id, created_at)
+           VALUES %s''',
+        [(f'{prefix}-{i}', 1, 'pending', 'pending', payment_id) for i, payment_id in enumerate(payment_ids)],
+        template="(%s, %s, %s, %s, %s, CURRENT_TIMESTAMP - INTERVAL '1 hour')"
+    )
+    conn.commit()
+
+    try:
+        started = time.perf_counter()
+        first = module.reconcile(dsn, client, batch_size=100, concurrency=args.concurrency, max_batches=args.orders)
+        elapsed = time.perf_counter() - started
+        second = module.reconcile(dsn, client, batch_size=100, concurrency=args.concurrency, max_batches=args.orders)
+
+        cur.execute(
+            'SELECT payment_status, status, COUNT(*) FROM orders WHERE order_number LIKE %s GROUP BY 1, 2',
+            (f'{prefix}-%',)
+        )
+        outcome = {f'{row[0]}/{row[1]}': row[2] for row in cur.fetchall()}
+    finally:
+        cur.execute('DELETE FROM orders WHERE order_number LIKE %s', (f'{prefix}-%',))
+        conn.commit()
+        cur.close()
+        conn.close()
+        client.close()
+        stub.stop()
+
+    print(json.dumps({
+        'benchmark': 'payment_reconcile',
+        'orders': args.orders,
+        'first_run': first,
+        'second_run': second,
+        'seconds': round(elapsed, 3),
+        'orders_per_sec': round(args.orders / elapsed, 1),
+        'outcome': outcome
+    }, indent=2))
+
+    assert first['updated'] == args.orders, first
+    assert second['updated'] == 0, second
+
+
+if __name__ == '__main__':
+    main()
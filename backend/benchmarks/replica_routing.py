@@ -0,0 +1,69 @@
+'''Маршрутизация чтения по репликам: свежая реплика, отставание, отказ.
+
+Без настоящей реплики роль реплики играет та же база под другим
+application_name, а отставание подставляется вместо pg_last_xact_replay_timestamp.
+Если задан DATABASE_READ_URLS (например, streaming-реплика), дополнительно
+прогоняется сценарий с настоящими репликами и реальным замером отставания.
+Код возврата 1, если маршрут не совпал с ожидаемым.
+
+Запуск: DATABASE_URL=... [DATABASE_READ_URLS=...] python backend/benchmarks/replica_routing.py
+'''
+import argparse
+import json
+import os
+import sys
+
+os.environ['RESPONSE_CACHE_MAX_ENTRIES'] = '0'
+
+from common import load_handler, make_event, measure, require_dsn, summarize
+
+from shared import db
+
+UNREACHABLE = 'postgresql://127.0.0.1:1/replica?connect_timeout=1'
+
+
+def scenario(catalog, urls, repeat, probe=None):
+    options = {'max_lag': 5}
+    if probe is not None:
+        options['probe'] = probe
+    db.configure_replicas(urls, **options)
+    events = [make_event(params={'page': str(i % 20 + 1), 'limit': '24'}) for i in range(repeat)]
+    samples = []
+    for event in events:
+        samples.extend(measure(lambda: catalog.handler(event, None), 1))
+    return {**summarize(samples), 'routing': db.replica_stats()}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    dsn = require_dsn()
+    catalog = load_handler('catalog')
+    standin = db.driver().extensions.make_dsn(dsn, application_name='replica-standin')
+
+    results = {
+        'fresh': scenario(catalog, [standin], args.repeat, probe=lambda conn: 0.0),
+        'lagging': scenario(catalog, [standin], args.repeat, probe=lambda conn: 60.0),
+        'unreachable': scenario(catalog, [UNREACHABLE], args.repeat),
+        'failover_to_next': scenario(catalog, [UNREACHABLE, standin], args.repeat, probe=lambda conn: 0.0)
+    }
+    expected = {
+        'fresh': lambda r: r['replica'] == args.repeat and r['primary'] == 0,
+        'lagging': lambda r: r['primary'] == args.repeat and r['lagging'] == args.repeat,
+        'unreachable': lambda r: r['primary'] == args.repeat and r['failed'] == 1,
+        'failover_to_next': lambda r: r['replica'] == args.repeat and r['failed'] == 1
+    }
+
+    if db.READ_URLS:
+        results['configured'] = scenario(catalog, db.READ_URLS, args.repeat)
+
+    failed = [name for name, check in expected.items() if not check(results[name]['routing'])]
+    print(json.dumps({'benchmark': 'replica_routing', 'results': results, 'failed': failed}, indent=2))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+'''Задержка поиска по каталогу и услугам на засеянных данных (15000/1000).
+
+legacy — прежний запрос name ILIKE '%term%' с запретом индексного доступа,
+то есть поведение до миграции V0003; handler — текущие обработчики.
+
+Запуск: DATABASE_URL=... python backend/benchmarks/search_latency.py
+'''
+import argparse
+import json
+import os
+
+import psycopg2
+
+os.environ['RESPONSE_CACHE_MAX_ENTRIES'] = '0'
+
+from common import load_handler, make_event, measure, require_dsn, summarize
+
+SEARCH_TERMS = ['камера', 'Hikvision', 'шлагбаум', 'DS-2', 'привод ворот', 'кабель UTP', 'датчик дымовой']
+
+LEGACY_QUERIES = {
+    'catalog': '''SELECT p.id FROM products p WHERE p.is_active = true AND p.name ILIKE %s
+                  ORDER BY p.created_at DESC LIMIT 24''',
+    'services': '''SELECT id FROM services WHERE is_active = true AND name ILIKE %s
+                   ORDER BY category, price LIMIT 50'''
+}
+
+
+def legacy_samples(dsn, function_name, repeat):
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute('SET enable_bitmapscan = off')
+    cur.execute('SET enable_indexscan = off')
+    samples = []
+    for term in SEARCH_TERMS:
+        samples.extend(measure(lambda: (cur.execute(LEGACY_QUERIES[function_name], (f'%{term}%',)), cur.fetchall()), repeat))
+    cur.close()
+    conn.close()
+    return samples
+
+
+def handler_samples(function_name, repeat):
+    module = load_handler(function_name)
+    samples = []
+    for term in SEARCH_TERMS:
+        event = make_event(params={'search': term})
+        samples.extend(measure(lambda: module.handler(event, None), repeat))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    dsn = require_dsn()
+    results = {}
+    for function_name in ('catalog', 'services'):
+        results[function_name] = {
+            'legacy': summarize(legacy_samples(dsn, function_name, args.repeat)),
+            'handler': summarize(handler_samples(function_name, args.repeat))
+        }
+
+    print(json.dumps({'benchmark': 'search_latency', 'terms': SEARCH_TERMS, 'results': results}, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
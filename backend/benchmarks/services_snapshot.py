@@ -0,0 +1,95 @@
+'''Список услуг: запрос к БД на каждый вызов против снимка в памяти.
+
+Без базы меряется только фильтрация и страница по синтетическому снимку
+на 1000 услуг. С DATABASE_URL сравниваются оба пути обработчика services
+на засеянных данных (кэш ответов отключён), а также проверяется, что
+снимок перечитывается после изменения таблицы (NOTIFY или версия).
+
+Запуск: [DATABASE_URL=...] python backend/benchmarks/services_snapshot.py
+'''
+import argparse
+import json
+import os
+import random
+
+os.environ['RESPONSE_CACHE_MAX_ENTRIES'] = '0'
+
+from common import load_handler, make_event, measure, summarize
+
+SEARCH_TERMS = ['установка', 'видеонаблюдения', 'доставка по городу', 'СКУД', 'монтаж автоматики']
+CATEGORIES = ['delivery', 'installation', 'setup', 'commissioning', 'maintenance', 'consulting', 'design']
+
+
+def requests_mix(rng, count):
+    mix = []
+    for _ in range(count):
+        params = {'page': str(rng.randint(1, 5))}
+        if rng.random() < 0.5:
+            params['category'] = rng.choice(CATEGORIES)
+        if rng.random() < 0.5:
+            params['search'] = rng.choice(SEARCH_TERMS)
+        mix.append(params)
+    return mix
+
+
+def synthetic(services, mix, repeat):
+    rng = random.Random(1)
+    rows = []
+    for i in range(1000):
+        template = ['Доставка по городу', 'Установка видеокамеры', 'Настройка СКУД', 'Монтаж автоматики'][i % 4]
+        rows.append((i, template, '', float(rng.randint(500, 50000)), CATEGORIES[i % len(CATEGORIES)], 2))
+    columns = services.ServiceColumns(sorted(rows, key=lambda r: (r[4], r[3], r[0])))
+
+    def run(params):
+        positions = columns.select(params.get('category', ''), params.get('search', ''))
+        offset = (int(params['page']) - 1) * 50
+        return [columns.row(p) for p in positions[offset:offset + 50]]
+
+    samples = []
+    for params in mix:
+        samples.extend(measure(lambda: run(params), repeat))
+    return summarize(samples)
+
+
+def with_database(services, mix, repeat):
+    import psycopg2
+
+    results = {}
+    for mode in ('query', 'snapshot'):
+        services.SNAPSHOT_ENABLED = mode == 'snapshot'
+        samples = []
+        for params in mix:
+            event = make_event(params=params)
+            samples.extend(measure(lambda: services.handler(event, None), repeat))
+        results[mode] = summarize(samples)
+
+    version = services.SNAPSHOT.version
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+    cur.execute('UPDATE services SET price = price WHERE id = (SELECT MIN(id) FROM services)')
+    conn.commit()
+    cur.close()
+    conn.close()
+    services.handler(make_event(), None)
+    results['refresh'] = {'before': version, 'after': services.SNAPSHOT.version, 'stats': services.SNAPSHOT.stats()}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    services = load_handler('services')
+    mix = requests_mix(random.Random(1), args.requests)
+    output = {'benchmark': 'services_snapshot', 'python_only': synthetic(services, mix, args.repeat)}
+
+    if os.environ.get('DATABASE_URL'):
+        output['with_database'] = with_database(services, mix, args.repeat)
+
+    print(json.dumps(output, indent=2))
+
+
+if __name__ == '__main__':
+    main()
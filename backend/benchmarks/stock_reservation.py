@@ -0,0 +1,174 @@
+'''Стресс-тест резерва остатков: много параллельных оформлений на горячие товары.
+
+Для нескольких активных товаров выставляется остаток --stock, затем --checkouts
+корзин из --threads потоков резервируют их в транзакциях:
+  locked_loop — прежний обходной путь: SELECT ... FOR UPDATE и UPDATE по товару в цикле;
+  set_based   — shared.stock.reserve, один условный UPDATE на корзину.
+Проверяется, что продано не больше остатка, остаток не ушёл в минус и
+совпадает с числом успешных резервов. Исходные остатки восстанавливаются.
+
+Запуск: DATABASE_URL=... python backend/benchmarks/stock_reservation.py
+'''
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+
+from common import require_dsn, summarize
+
+from shared import stock
+
+
+def locked_loop(cur, lines):
+    for product_id, _, quantity in sorted(lines):
+        cur.execute('SELECT stock_quantity FROM products WHERE id = %s FOR UPDATE', (product_id,))
+        if cur.fetchone()[0] < quantity:
+            return [{'id': product_id}]
+        cur.execute('UPDATE products SET stock_quantity = stock_quantity - %s WHERE id = %s', (quantity, product_id))
+    return []
+
+
+def set_based(cur, lines):
+    return stock.reserve(cur, lines)
+
+
+def run(dsn, reserve, carts, threads):
+    local = threading.local()
+    connections = []
+    lock = threading.Lock()
+
+    def checkout(lines):
+        conn = getattr(local, 'conn', None)
+        if conn is None:
+            conn = local.conn = psycopg2.connect(dsn)
+            with lock:
+                connections.append(conn)
+        cur = conn.cursor()
+        started = time.perf_counter()
+        shortages = reserve(cur, lines)
+        if shortages:
+            conn.rollback()
+        else:
+            conn.commit()
+        cur.close()
+        return time.perf_counter() - started, not shortages, lines
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(checkout, carts))
+    elapsed = time.perf_counter() - started
+
+    for conn in connections:
+        conn.close()
+
+    sold = {}
+    for _, ok, lines in results:
+        if ok:
+            for product_id, _, quantity in lines:
+                sold[product_id] = sold.get(product_id, 0) + quantity
+
+    return {
+        **summarize([r[0] for r in results]),
+        'checkouts_per_sec': round(len(results) / elapsed, 1),
+        'succeeded': sum(1 for r in results if r[1]),
+        'rejected': sum(1 for r in results if not r[1])
+    }, sold
+
+
+def set_stock(dsn, product_ids, quantity):
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute('SELECT id, stock_quantity FROM products WHERE id = ANY(%s)', (product_ids,))
+    previous = dict(cur.fetchall())
+    cur.execute('UPDATE products SET stock_quantity = %s WHERE id = ANY(%s)', (quantity, product_ids))
+    conn.commit()
+    cur.close()
+    conn.close()
+    return previous
+
+
+def read_stock(dsn, product_ids):
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute('SELECT id, stock_quantity FROM products WHERE id = ANY(%s)', (product_ids,))
+    current = dict(cur.fetchall())
+    cur.close()
+    conn.close()
+    return current
+
+
+def restore_stock(dsn, previous):
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    for product_id, quantity in previous.items():
+        cur.execute('UPDATE products SET stock_quantity = %s WHERE id = %s', (quantity, product_id))
+    conn.commit()
+    cur.close()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=5, help='число горячих товаров')
+    parser.add_argument('--stock', type=int, default=200)
+    parser.add_argument('--checkouts', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    dsn = require_dsn()
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute('SELECT id FROM products WHERE is_active = true ORDER BY id LIMIT %s', (args.products,))
+    product_ids = [row[0] for row in cur.fetchall()]
+    cur.close()
+    conn.close()
+
+    rng = random.Random(args.seed)
+    carts = []
+    for _ in range(args.checkouts):
+        chosen = rng.sample(product_ids, rng.randint(1, len(product_ids)))
+        carts.append([(product_id, None, rng.randint(1, 3)) for product_id in chosen])
+
+    results = {}
+    violations = []
+    previous = None
+    try:
+        for name, reserve in (('locked_loop', locked_loop), ('set_based', set_based)):
+            saved = set_stock(dsn, product_ids, args.stock)
+            if previous is None:
+                previous = saved
+            summary, sold = run(dsn, reserve, carts, args.threads)
+            remaining = read_stock(dsn, product_ids)
+            for product_id in product_ids:
+                expected = args.stock - sold.get(product_id, 0)
+                if remaining[product_id] < 0 or remaining[product_id] != expected or sold.get(product_id, 0) > args.stock:
+                    violations.append({'mode': name, 'id': product_id, 'remaining': remaining[product_id],
+                                       'expected': expected, 'sold': sold.get(product_id, 0)})
+            summary['sold'] = sum(sold.values())
+            summary['remaining'] = sum(remaining.values())
+            results[name] = summary
+    finally:
+        if previous is not None:
+            restore_stock(dsn, previous)
+
+    print(json.dumps({
+        'benchmark': 'stock_reservation',
+        'products': product_ids,
+        'stock_per_product': args.stock,
+        'checkouts': args.checkouts,
+        'threads': args.threads,
+        'results': results,
+        'oversell': violations
+    }, indent=2))
+    if violations:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+'''Локальная заглушка API ЮKassa для бенчмарков и проверки клиента.
+
+Поддерживает POST /v3/payments и GET /v3/payments/<id>, keep-alive (HTTP/1.1),
+искусственную задержку и отказ первых N запросов кодом 503.
+'''
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubProvider:
+    def __init__(self, latency=0.0, fail_first=0, status='succeeded'):
+        self.latency = latency
+        self.fail_first = fail_first
+        self.status = status
+        self.payments = {}
+        self.by_key = {}
+        self.statuses = {}
+        self.requests = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f'http://{host}:{port}/v3'
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def create(self, key, payload):
+        with self.lock:
+            if key and key in self.by_key:
+                return self.payments[self.by_key[key]]
+            payment_id = str(uuid.uuid4())
+            payment = {
+                'id': payment_id,
+                'status': 'pending',
+                'amount': payload.get('amount'),
+                'metadata': payload.get('metadata', {}),
+                'confirmation': {'type': 'redirect', 'confirmation_url': f'https://stub.local/confirm/{payment_id}'}
+            }
+            self.payments[payment_id] = payment
+            if key:
+                self.by_key[key] = payment_id
+            return payment
+
+    def _handler_class(self):
+        provider = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with provider.lock:
+                    provider.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                if self._should_fail():
+                    return self._send(503, {'type': 'error', 'code': 'service_unavailable'})
+                if not self.path.endswith('/payments'):
+                    return self._send(404, {'type': 'error', 'code': 'not_found'})
+                self._send(200, provider.create(self.headers.get('Idempotence-Key'), payload))
+
+            def do_GET(self):
+                if self._should_fail():
+                    return self._send(503, {'type': 'error', 'code': 'service_unavailable'})
+                payment_id = self.path.rsplit('/', 1)[-1]
+                payment = provider.payments.get(payment_id)
+                if payment is None:
+                    return self._send(404, {'type': 'error', 'code': 'not_found'})
+                self._send(200, {**payment, 'status': provider.statuses.get(payment_id, provider.status)})
+
+            def _should_fail(self):
+                with provider.lock:
+                    provider.requests += 1
+                    failing = provider.requests <= provider.fail_first
+                if provider.latency:
+                    time.sleep(provider.latency)
+                return failing
+
+            def _send(self, status, body):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
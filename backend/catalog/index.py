@@ -1,84 +1,180 @@
+import base64
+import csv
+import io
 import json
 import os
-import psycopg2
-from urllib.parse import parse_qs
+from datetime import datetime
+from decimal import Decimal
+from shared import admission, cache, db, runtime, timing
 
-def handler(event, context):
-    '''API для каталога товаров с фильтрацией и поиском'''
-    
-    method = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
-            },
-            'body': ''
-        }
-    
-    if method != 'GET':
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
-    
-    params = event.get('queryStringParameters') or {}
-    
+SEARCH_RANK = "(ts_rank(p.search_vector, plainto_tsquery('russian', %s)) + similarity(p.name, %s))"
+
+PRODUCT_FIELDS = '''
+    'id', p.id,
+    'name', p.name,
+    'price', p.price::float8,
+    'image', COALESCE(NULLIF(p.image_url, ''), '/placeholder.svg'),
+    'rating', COALESCE(p.rating, 0)::float8,
+    'specs', COALESCE(p.specs, '[]'::jsonb),
+    'stock', p.stock_quantity,
+    'category', c.name,
+    'category_id', c.id,
+    'brand', b.name,
+    'brand_id', b.id'''
+
+PRODUCT_JSON = f'json_build_object({PRODUCT_FIELDS})::text'
+
+EXPORT_JSON = f"json_build_object({PRODUCT_FIELDS}, 'is_active', p.is_active, 'updated_at', p.updated_at)::text"
+
+EXPORT_CSV_COLUMNS = (
+    'id', 'name', 'price', 'image', 'rating', 'specs', 'stock',
+    'category', 'category_id', 'brand', 'brand_id', 'is_active', 'updated_at'
+)
+
+EXPORT_CSV_SELECT = '''p.id, p.name, p.price, COALESCE(NULLIF(p.image_url, ''), '/placeholder.svg'),
+    COALESCE(p.rating, 0), COALESCE(p.specs, '[]'::jsonb)::text, p.stock_quantity,
+    c.name, c.id, b.name, b.id, p.is_active, p.updated_at'''
+
+EXPORT_MAX_ROWS = int(os.environ.get('CATALOG_EXPORT_MAX_ROWS', '50000'))
+EXPORT_ITERSIZE = 2000
+
+DEFAULT_LIMIT = 24
+MAX_LIMIT = int(os.environ.get('CATALOG_MAX_LIMIT', '500'))
+STATEMENT_TIMEOUT_MS = admission.statement_timeout('catalog', 5000)
+EXPORT_STATEMENT_TIMEOUT_MS = admission.statement_timeout('catalog_export', 60000)
+
+PRICE_BUCKETS = 10
+SPEC_FACETS_LIMIT = 50
+MAX_SPEC_FILTERS = 20
+
+# sort -> (выражение ключа, направление, приведение значения курсора)
+SORTS = {
+    'newest': ('p.created_at', 'DESC', ''),
+    'price_asc': ('p.price', 'ASC', ''),
+    'price_desc': ('p.price', 'DESC', ''),
+    'rating': ('p.rating', 'DESC', ''),
+    'relevance': (SEARCH_RANK, 'DESC', '::real')
+}
+
+CURSOR_TYPES = {
+    'newest': datetime.fromisoformat,
+    'updated': datetime.fromisoformat,
+    'price_asc': Decimal,
+    'price_desc': Decimal,
+    'rating': Decimal,
+    'relevance': float
+}
+
+RESPONSE_CACHE = cache.ResponseCache('catalog', ttl=30, versions=['catalog'])
+
+FACETS_QUERY = '''
+    WITH filtered AS (
+        SELECT p.category_id, c.name as category_name, p.brand_id, b.name as brand_name, p.price,
+               MIN(p.price) OVER () as min_price, MAX(p.price) OVER () as max_price
+        FROM products p
+        LEFT JOIN categories c ON p.category_id = c.id
+        LEFT JOIN brands b ON p.brand_id = b.id
+        WHERE {where}
+    ), bucketed AS (
+        SELECT *, width_bucket(price, min_price, max_price + 0.01, %s) as bucket
+        FROM filtered
+    )
+    SELECT GROUPING(category_id, category_name, brand_id, brand_name, bucket),
+           category_id, category_name, brand_id, brand_name, bucket,
+           COUNT(*), MIN(price), MAX(price)
+    FROM bucketed
+    GROUP BY GROUPING SETS ((category_id, category_name), (brand_id, brand_name), (bucket))
+'''
+
+SPEC_FACETS_QUERY = '''
+    SELECT spec, COUNT(*)
+    FROM products p,
+        jsonb_array_elements_text(CASE WHEN jsonb_typeof(p.specs) = 'array' THEN p.specs ELSE '[]'::jsonb END) AS spec
+    WHERE {where}
+    GROUP BY spec
+    ORDER BY COUNT(*) DESC, spec
+    LIMIT %s
+'''
+
+
+def encode_cursor(value, product_id, sort='newest'):
+    '''Упаковать позицию (ключ сортировки, id) в непрозрачный курсор'''
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    elif isinstance(value, Decimal):
+        value = str(value)
+    raw = json.dumps([sort, value, product_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort='newest'):
+    '''Распаковать курсор для сортировки sort; ValueError при некорректном значении.
+
+    Курсоры без сортировки (прежний формат [created_at, id]) принимаются для
+    сортировок по времени.
+    '''
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        parts = json.loads(base64.urlsafe_b64decode(padded))
+        if len(parts) == 2 and sort in ('newest', 'updated'):
+            parts = [sort] + parts
+        cursor_sort, value, product_id = parts
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if cursor_sort != sort:
+        raise ValueError('Cursor does not match sort')
+    try:
+        return CURSOR_TYPES[sort](value), int(product_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def build_filters(params):
+    '''Условия WHERE и параметры для search/categories/brands/specs/min_price/max_price.
+
+    Один id категории или бренда сравнивается через =, а не = ANY: только так
+    индекс (category_id | brand_id, created_at, id) отдаёт строки уже в порядке
+    сортировки и страница читается без сортировки всей категории.
+    '''
     search = params.get('search', '')
     category_ids = params.get('categories', '')
     brand_ids = params.get('brands', '')
+    specs = params.get('specs', '')
     min_price = params.get('min_price', '0')
     max_price = params.get('max_price', '999999999')
-    page = int(params.get('page', '1'))
-    limit = int(params.get('limit', '24'))
-    
-    offset = (page - 1) * limit
-    
-    dsn = os.environ.get('DATABASE_URL')
-    if not dsn:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'DATABASE_URL not configured'})
-        }
-    
-    conn = psycopg2.connect(dsn)
-    cur = conn.cursor()
-    
-    query = '''
-        SELECT 
-            p.id, p.name, p.price, p.image_url, p.rating, p.specs, p.stock_quantity,
-            c.name as category_name, c.id as category_id,
-            b.name as brand_name, b.id as brand_id
-        FROM products p
-        LEFT JOIN categories c ON p.category_id = c.id
-        LEFT JOIN brands b ON p.brand_id = b.id
-        WHERE p.is_active = true
-    '''
     
     conditions = []
     values = []
     
     if search:
-        conditions.append("p.name ILIKE %s")
+        conditions.append("(p.search_vector @@ plainto_tsquery('russian', %s) OR p.name ILIKE %s)")
+        values.append(search)
         values.append(f'%{search}%')
     
     if category_ids:
         cat_list = [int(x) for x in category_ids.split(',') if x.isdigit()]
-        if cat_list:
-            conditions.append(f"p.category_id = ANY(%s)")
+        if len(cat_list) == 1:
+            conditions.append("p.category_id = %s")
+            values.append(cat_list[0])
+        elif cat_list:
+            conditions.append("p.category_id = ANY(%s)")
             values.append(cat_list)
     
     if brand_ids:
         brand_list = [int(x) for x in brand_ids.split(',') if x.isdigit()]
-        if brand_list:
-            conditions.append(f"p.brand_id = ANY(%s)")
+        if len(brand_list) == 1:
+            conditions.append("p.brand_id = %s")
+            values.append(brand_list[0])
+        elif brand_list:
+            conditions.append("p.brand_id = ANY(%s)")
             values.append(brand_list)
     
+    if specs:
+        spec_list = [x.strip() for x in specs.split(',') if x.strip()][:MAX_SPEC_FILTERS]
+        if spec_list:
+            conditions.append("p.specs @> %s::jsonb")
+            values.append(json.dumps(spec_list, ensure_ascii=False))
+    
     try:
         min_p = float(min_price)
         max_p = float(max_price)
@@ -88,46 +184,272 @@ def handler(event, context):
     except:
         pass
     
-    if conditions:
-        query += ' AND ' + ' AND '.join(conditions)
-    
-    count_query = f"SELECT COUNT(*) FROM ({query}) as filtered"
-    cur.execute(count_query, values)
-    total_count = cur.fetchone()[0]
-    
-    query += ' ORDER BY p.created_at DESC LIMIT %s OFFSET %s'
-    values.extend([limit, offset])
-    
-    cur.execute(query, values)
-    rows = cur.fetchall()
-    
-    products = []
-    for row in rows:
-        products.append({
-            'id': row[0],
-            'name': row[1],
-            'price': float(row[2]),
-            'image': row[3] or '/placeholder.svg',
-            'rating': float(row[4]) if row[4] else 0,
-            'specs': row[5] or [],
-            'stock': row[6],
-            'category': row[7],
-            'category_id': row[8],
-            'brand': row[9],
-            'brand_id': row[10]
-        })
+    return conditions, values
+
+
+def page_query(conditions, filter_values, sort, search, limit, offset=0, after=None, with_total=False):
+    '''SQL и параметры страницы каталога.
+
+    Внутренний запрос выбирает только id и ключ сортировки и отсекает страницу
+    по индексу; точный total считается там же отдельным COUNT(*) по тем же
+    условиям. JSON товара и соединения с категориями и брендами строятся
+    только для строк страницы.
+    '''
+    sort_key, direction, cast = SORTS[sort]
+    sort_values = [search, search] if sort == 'relevance' else []
+    where = ' AND '.join(['p.is_active = true'] + conditions)
+    
+    columns = f'p.id, {sort_key} as sort_key'
+    values = list(sort_values)
+    if with_total:
+        columns += f', (SELECT COUNT(*) FROM products p WHERE {where}) as total_count'
+        values.extend(filter_values)
+    else:
+        columns += ', NULL::bigint as total_count'
+    values.extend(filter_values)
+    
+    if after is None:
+        bounds = 'LIMIT %s OFFSET %s'
+        values.extend([limit + 1, offset])
+    else:
+        comparison = '<' if direction == 'DESC' else '>'
+        where += f' AND ({sort_key}, p.id) {comparison} (%s{cast}, %s)'
+        values.extend(sort_values + [after[0], after[1], limit + 1])
+        bounds = 'LIMIT %s'
+    
+    query = f'''
+        SELECT {PRODUCT_JSON}, page.sort_key, p.id, page.total_count
+        FROM (
+            SELECT {columns}
+            FROM products p
+            WHERE {where}
+            ORDER BY sort_key {direction}, p.id {direction}
+            {bounds}
+        ) page
+        JOIN products p ON p.id = page.id
+        LEFT JOIN categories c ON p.category_id = c.id
+        LEFT JOIN brands b ON p.brand_id = b.id
+        ORDER BY page.sort_key {direction}, page.id {direction}
+    '''
+    return query, values
+
+
+def iter_export(conn, fmt, conditions, values, after=None, max_rows=EXPORT_MAX_ROWS):
+    '''Строки выгрузки через именованный курсор в порядке (updated_at, id).
+
+    Отдаёт строки NDJSON/CSV по одной; последним элементом возвращает курсор
+    продолжения или None, если выгрузка закончена.
+    '''
+    if after is not None:
+        conditions = conditions + ['(p.updated_at, p.id) > (%s, %s)']
+        values = values + [after[0], after[1]]
+    
+    select = EXPORT_JSON if fmt == 'ndjson' else EXPORT_CSV_SELECT
+    where = ' AND '.join(conditions) if conditions else 'true'
+    query = f'''
+        SELECT {select}, p.updated_at, p.id
+        FROM products p
+        LEFT JOIN categories c ON p.category_id = c.id
+        LEFT JOIN brands b ON p.brand_id = b.id
+        WHERE {where}
+        ORDER BY p.updated_at, p.id
+        LIMIT %s
+    '''
+    
+    cur = conn.cursor(name='catalog_export')
+    cur.itersize = EXPORT_ITERSIZE
+    cur.execute(query, values + [max_rows + 1])
+    
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow(EXPORT_CSV_COLUMNS)
+        yield buffer.getvalue()
+    
+    count = 0
+    last = None
+    next_cursor = None
+    for row in cur:
+        if count == max_rows:
+            next_cursor = encode_cursor(last[0], last[1], 'updated')
+            break
+        count += 1
+        last = row[-2:]
+        if fmt == 'ndjson':
+            yield row[0] + '\n'
+        else:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerow(row[:-2])
+            yield buffer.getvalue()
     
     cur.close()
-    conn.close()
+    yield next_cursor
+
+
+def export_response(dsn, params, conditions, values, after):
+    fmt = params.get('export')
+    if fmt not in ('ndjson', 'csv'):
+        return runtime.error(400, 'export must be ndjson or csv')
+    
+    updated_since = params.get('updated_since', '')
+    if updated_since:
+        try:
+            since = datetime.fromisoformat(updated_since)
+        except ValueError:
+            return runtime.error(400, 'updated_since must be an ISO 8601 timestamp')
+        conditions = conditions + ['p.updated_at >= %s']
+        values = values + [since]
+    else:
+        conditions = ['p.is_active = true'] + conditions
+    
+    with db.read_connection(dsn, EXPORT_STATEMENT_TIMEOUT_MS) as conn:
+        # Именованный курсор выбирает строки пачками при итерации, мимо замеров execute
+        with timing.phase('export'):
+            *chunks, next_cursor = iter_export(conn, fmt, conditions, values, after)
+        conn.rollback()
+    
+    headers = {
+        'Content-Type': 'application/x-ndjson' if fmt == 'ndjson' else 'text/csv; charset=utf-8',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'X-Next-Cursor',
+        'Cache-Control': 'no-store'
+    }
+    if next_cursor:
+        headers['X-Next-Cursor'] = next_cursor
+    
+    return {'statusCode': 200, 'headers': headers, 'body': ''.join(chunks)}
+
+
+def fetch_facets(cur, conditions, values):
+    '''Счётчики по категориям, брендам, гистограмма цен (один проход) и счётчики характеристик для текущего фильтра'''
+    where = ' AND '.join(['p.is_active = true'] + conditions)
+    cur.execute(FACETS_QUERY.format(where=where), values + [PRICE_BUCKETS])
+    
+    categories = []
+    brands = []
+    histogram = []
+    for row in cur.fetchall():
+        level, category_id, category_name, brand_id, brand_name, bucket, count, low, high = row
+        if level == 0b00111:
+            categories.append({'id': category_id, 'name': category_name, 'count': count})
+        elif level == 0b11001:
+            brands.append({'id': brand_id, 'name': brand_name, 'count': count})
+        else:
+            histogram.append({'bucket': bucket, 'min': float(low), 'max': float(high), 'count': count})
+    
+    categories.sort(key=lambda x: -x['count'])
+    brands.sort(key=lambda x: -x['count'])
+    histogram.sort(key=lambda x: x['bucket'])
+    
+    cur.execute(SPEC_FACETS_QUERY.format(where=where), values + [SPEC_FACETS_LIMIT])
+    specs = [{'value': spec, 'count': count} for spec, count in cur.fetchall()]
     
-    return {
-        'statusCode': 200,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({
-            'products': products,
+    return {'categories': categories, 'brands': brands, 'specs': specs, 'price_histogram': histogram}
+
+
+@runtime.route(['GET'])
+@admission.guard()
+@cache.cached(RESPONSE_CACHE)
+def handler(event, context):
+    '''API для каталога товаров с фильтрацией и поиском'''
+    
+    params = event.get('queryStringParameters') or {}
+    
+    search = params.get('search', '')
+    cursor = params.get('cursor', '')
+    include_total = params.get('include_total', 'exact')
+    with_facets = params.get('facets', '') in ('1', 'true')
+    sort = params.get('sort') or ('relevance' if search else 'newest')
+    
+    try:
+        page, limit = admission.paging(params, DEFAULT_LIMIT, MAX_LIMIT)
+    except ValueError as e:
+        return runtime.error(400, str(e))
+    
+    if include_total not in ('exact', 'estimate', 'none'):
+        return runtime.error(400, 'include_total must be exact, estimate or none')
+    
+    if sort not in SORTS:
+        return runtime.error(400, 'sort must be one of: ' + ', '.join(SORTS))
+    if sort == 'relevance' and not search:
+        sort = 'newest'
+    
+    offset = (page - 1) * limit
+    
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor, 'updated' if params.get('export') else sort)
+        except ValueError as e:
+            return runtime.error(400, str(e))
+    
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        return runtime.error(500, 'DATABASE_URL not configured')
+    
+    if params.get('export'):
+        conditions, values = build_filters(params)
+        return export_response(dsn, params, conditions, values, after)
+    
+    with db.read_connection(dsn, STATEMENT_TIMEOUT_MS) as conn:
+        cur = conn.cursor()
+        
+        conditions, filter_values = build_filters(params)
+        filter_query = 'SELECT p.id FROM products p WHERE ' + ' AND '.join(['p.is_active = true'] + conditions)
+        query, values = page_query(conditions, filter_values, sort, search, limit, offset, after,
+                                   with_total=after is None and include_total == 'exact')
+        
+        facets = None
+        if with_facets:
+            with timing.phase('facets'):
+                facets = fetch_facets(cur, conditions, filter_values)
+        
+        total_count = None
+        if after is None and include_total == 'estimate':
+            with timing.phase('estimate'):
+                total_count = db.estimate_rows(cur, filter_query, filter_values)
+        
+        with timing.phase('page_query'):
+            cur.execute(query, values)
+            rows = cur.fetchall()
+        
+        if after is None and include_total == 'exact':
+            if rows:
+                total_count = rows[0][3]
+            elif offset > 0:
+                with timing.phase('count'):
+                    total_count = db.count_rows(cur, filter_query, filter_values)
+            else:
+                total_count = 0
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][1], rows[-1][2], sort)
+        
+        with timing.phase('serialize'):
+            products = '[' + ','.join(row[0] for row in rows) + ']'
+        
+        cur.close()
+    
+    if after is not None:
+        result = {
+            'limit': limit,
+            'next_cursor': next_cursor
+        }
+    else:
+        result = {
             'total': total_count,
             'page': page,
             'limit': limit,
-            'pages': (total_count + limit - 1) // limit
-        })
-    }
+            'pages': (total_count + limit - 1) // limit if total_count is not None else None,
+            'next_cursor': next_cursor
+        }
+    result['sort'] = sort
+    
+    if facets is not None:
+        result['facets'] = facets
+    
+    with timing.phase('serialize'):
+        return runtime.json_response(200, result, raw={'products': products})
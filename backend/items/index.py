@@ -0,0 +1,109 @@
+import os
+from shared import admission, cache, db, runtime
+
+MAX_IDS = int(os.environ.get('ITEMS_MAX_IDS', '500'))
+ITEM_CACHE_TTL = float(os.environ.get('ITEMS_CACHE_TTL', '5'))
+STATEMENT_TIMEOUT_MS = admission.statement_timeout('items', 2000)
+
+ITEMS_QUERY = '''
+    SELECT 'product', p.id, p.name, p.price::float8, p.stock_quantity, p.is_active,
+        COALESCE(p.image_url, '/placeholder.svg'), NULL::integer
+    FROM products p WHERE p.id = ANY(%s)
+    UNION ALL
+    SELECT 'service', s.id, s.name, s.price::float8, NULL::integer, s.is_active,
+        NULL, s.duration_hours
+    FROM services s WHERE s.id = ANY(%s)
+'''
+
+ITEM_CACHE = cache.ItemCache(ttl=ITEM_CACHE_TTL)
+
+
+def parse_ids(value):
+    '''Разобрать список id через запятую без дублей, сохраняя порядок'''
+    if not value:
+        return []
+    ids = []
+    seen = set()
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        item_id = int(part)
+        if item_id not in seen:
+            seen.add(item_id)
+            ids.append(item_id)
+    return ids
+
+
+def to_item(row):
+    if row[0] == 'product':
+        return {
+            'id': row[1],
+            'name': row[2],
+            'price': row[3],
+            'stock': row[4],
+            'is_active': row[5],
+            'image': row[6]
+        }
+    return {
+        'id': row[1],
+        'name': row[2],
+        'price': row[3],
+        'is_active': row[5],
+        'duration_hours': row[7]
+    }
+
+
+def fetch_items(dsn, product_ids, service_ids):
+    '''Вернуть {(kind, id): item}; промахи кэша добираются одним запросом по первичному ключу'''
+    keys = [('product', i) for i in product_ids] + [('service', i) for i in service_ids]
+    found, missing = ITEM_CACHE.get_many(keys)
+    if not missing:
+        return found
+
+    with db.read_connection(dsn, STATEMENT_TIMEOUT_MS) as conn:
+        cur = conn.cursor()
+        cur.execute(ITEMS_QUERY, (
+            [key[1] for key in missing if key[0] == 'product'],
+            [key[1] for key in missing if key[0] == 'service']
+        ))
+        loaded = {(row[0], row[1]): to_item(row) for row in cur.fetchall()}
+        cur.close()
+
+    ITEM_CACHE.put_many(loaded)
+    found.update(loaded)
+    return found
+
+
+@runtime.route(['GET'])
+@admission.guard()
+def handler(event, context):
+    '''API для получения товаров и услуг по списку id (корзина, страница заказа)'''
+
+    params = event.get('queryStringParameters') or {}
+
+    try:
+        product_ids = parse_ids(params.get('ids', ''))
+        service_ids = parse_ids(params.get('service_ids', ''))
+    except ValueError:
+        return runtime.error(400, 'ids and service_ids must be comma-separated integers')
+
+    if not product_ids and not service_ids:
+        return runtime.error(400, 'ids or service_ids required')
+    if len(product_ids) + len(service_ids) > MAX_IDS:
+        return runtime.error(400, f'At most {MAX_IDS} ids per request')
+
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        return runtime.error(500, 'DATABASE_URL not configured')
+
+    items = fetch_items(dsn, product_ids, service_ids)
+
+    return runtime.json_response(200, {
+        'products': [items[('product', i)] for i in product_ids if ('product', i) in items],
+        'services': [items[('service', i)] for i in service_ids if ('service', i) in items],
+        'missing': {
+            'products': [i for i in product_ids if ('product', i) not in items],
+            'services': [i for i in service_ids if ('service', i) not in items]
+        }
+    }, headers={'Cache-Control': f'public, max-age={int(ITEM_CACHE_TTL)}'})
@@ -0,0 +1,123 @@
+import functools
+import json
+import os
+import threading
+import time
+
+from . import cache, db, timing
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+CORS_HEADERS = {'Access-Control-Allow-Origin': '*'}
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+
+STATS_LOG_INTERVAL_SECONDS = float(os.environ.get('STATS_LOG_INTERVAL', '60'))
+
+_stats_logged_at = time.monotonic()
+_stats_lock = threading.Lock()
+
+
+def dumps(body):
+    '''JSON через orjson, если он установлен, иначе через стандартный json'''
+    if orjson is not None:
+        return orjson.dumps(body).decode('utf-8')
+    return json.dumps(body)
+
+
+def json_response(status, body, headers=None, raw=None):
+    '''Ответ с JSON-телом; raw — готовые JSON-фрагменты верхнего уровня, вставляемые без разбора'''
+    text = dumps(body)
+    if raw:
+        fragments = ', '.join(f'{json.dumps(key)}: {value}' for key, value in raw.items())
+        text = '{' + fragments + (', ' + text[1:] if text != '{}' else '}')
+    return {
+        'statusCode': status,
+        'headers': {**JSON_HEADERS, **headers} if headers else dict(JSON_HEADERS),
+        'body': text
+    }
+
+
+def error(status, message, headers=None, **extra):
+    '''Единый формат ошибки: {"error": message, ...}'''
+    return json_response(status, {'error': message, **extra}, headers)
+
+
+def preflight(methods, allow_headers='Content-Type'):
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': ', '.join(list(methods) + ['OPTIONS']),
+            'Access-Control-Allow-Headers': allow_headers
+        },
+        'body': ''
+    }
+
+
+def log_stats(function_name):
+    '''Не чаще раза в STATS_LOG_INTERVAL_SECONDS записать строку runtime_stats: кэши ответов, пулы, реплики'''
+    global _stats_logged_at
+    if STATS_LOG_INTERVAL_SECONDS <= 0:
+        return
+    now = time.monotonic()
+    with _stats_lock:
+        if now - _stats_logged_at < STATS_LOG_INTERVAL_SECONDS:
+            return
+        _stats_logged_at = now
+    timing.log('runtime_stats', function=function_name, cache=cache.stats(), pools=db.stats(),
+               replicas=db.replica_stats())
+
+
+def route(methods, allow_headers='Content-Type'):
+    '''Обработать OPTIONS и 405 до вызова обработчика и завернуть необработанные исключения в 500.
+
+    Обработчик и его тяжёлые зависимости (драйвер БД, HTTP-клиент) не
+    затрагиваются, пока запрос не прошёл проверку метода.
+    '''
+    methods = tuple(methods)
+
+    def decorator(handler):
+        target = handler
+        while hasattr(target, '__wrapped__'):
+            target = target.__wrapped__
+        function_name = os.path.basename(os.path.dirname(target.__code__.co_filename))
+
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            method = event.get('httpMethod', methods[0])
+
+            if method == 'OPTIONS':
+                return preflight(methods, allow_headers)
+
+            if method not in methods:
+                return error(405, 'Method not allowed')
+
+            timer = timing.start()
+            try:
+                response = handler(event, context)
+            except Exception:
+                import sys
+                import traceback
+                traceback.print_exc(file=sys.stderr)
+                response = error(500, 'Internal server error')
+
+            if timer is not None:
+                timing.finish()
+                response['headers'] = {
+                    **response.get('headers', {}),
+                    'Server-Timing': timer.server_timing(),
+                    'Timing-Allow-Origin': '*'
+                }
+                timing.log('request_timing', function=function_name, method=method,
+                           status=response.get('statusCode'), total_ms=round(timer.elapsed() * 1000, 3),
+                           phases=timer.summary())
+            log_stats(function_name)
+            return response
+
+        return wrapper
+
+    return decorator
+
@@ -0,0 +1,141 @@
+import base64
+import json
+import os
+import re
+from datetime import datetime
+from shared import admission, cache, db, runtime
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+STATEMENT_TIMEOUT_MS = admission.statement_timeout('orders', 2000)
+
+ORDER_NUMBER_PATTERN = re.compile(r'^ORD-[0-9A-F]{8}$')
+
+# Страница заказов выбирается по индексу во вложенном запросе, позиции подтягиваются только к ней
+ORDERS_QUERY = '''
+    SELECT o.id, o.order_number, o.status, o.payment_status, o.total_amount::float8, o.created_at,
+           o.customer_name, o.customer_email, o.customer_phone,
+           COALESCE(json_agg(json_build_object(
+               'productId', oi.product_id,
+               'serviceId', oi.service_id,
+               'name', COALESCE(p.name, s.name),
+               'quantity', oi.quantity,
+               'price', oi.price::float8
+           ) ORDER BY oi.id) FILTER (WHERE oi.id IS NOT NULL), '[]')
+    FROM (
+        SELECT * FROM orders
+        WHERE {where}
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s
+    ) o
+    LEFT JOIN order_items oi ON oi.order_id = o.id
+    LEFT JOIN products p ON p.id = oi.product_id
+    LEFT JOIN services s ON s.id = oi.service_id
+    GROUP BY o.id, o.order_number, o.status, o.payment_status, o.total_amount, o.created_at,
+             o.customer_name, o.customer_email, o.customer_phone
+    ORDER BY o.created_at DESC, o.id DESC
+'''
+
+
+def encode_cursor(created_at, order_id):
+    raw = json.dumps([created_at.isoformat(), order_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    '''Распаковать курсор (created_at, id); ValueError при некорректном значении'''
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, order_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(order_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def to_order(row, with_customer):
+    order = {
+        'id': row[0],
+        'orderNumber': row[1],
+        'status': row[2],
+        'paymentStatus': row[3],
+        'totalAmount': row[4],
+        'createdAt': row[5].isoformat() if row[5] else None,
+        'items': row[9]
+    }
+    if with_customer:
+        order['customer'] = {'name': row[6], 'email': row[7], 'phone': row[8]}
+    return order
+
+
+def is_staff(event):
+    token = os.environ.get('ORDERS_LOOKUP_TOKEN')
+    return bool(token) and cache.header(event, 'X-Orders-Token') == token
+
+
+@runtime.route(['GET'], allow_headers='Content-Type, X-Orders-Token')
+@admission.guard()
+def handler(event, context):
+    '''Поиск заказа по номеру или заказов покупателя по email (для колл-центра)'''
+
+    params = event.get('queryStringParameters') or {}
+    order_number = params.get('order_number', '').strip().upper()
+    email = params.get('email', '').strip()
+    staff = is_staff(event)
+
+    if not order_number and not email:
+        return runtime.error(400, 'order_number or email required')
+
+    if order_number and not ORDER_NUMBER_PATTERN.match(order_number):
+        return runtime.error(400, 'Invalid order_number')
+
+    if email and not order_number and not staff:
+        return runtime.error(403, 'Forbidden')
+
+    after = None
+    if params.get('cursor'):
+        try:
+            after = decode_cursor(params['cursor'])
+        except ValueError as e:
+            return runtime.error(400, str(e))
+
+    try:
+        limit = max(1, min(int(params.get('limit') or DEFAULT_LIMIT), MAX_LIMIT))
+    except ValueError:
+        return runtime.error(400, 'limit must be an integer')
+
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        return runtime.error(500, 'DATABASE_URL not configured')
+
+    if order_number:
+        where, values = 'order_number = %s', [order_number, 1]
+    else:
+        where, values = 'customer_email = %s', [email]
+        if after is not None:
+            where += ' AND (created_at, id) < (%s, %s)'
+            values.extend(after)
+        values.append(limit + 1)
+
+    # Сразу после оплаты заказ читается с primary, чтобы не отстать от записи
+    with db.connection(dsn, STATEMENT_TIMEOUT_MS) as conn:
+        cur = conn.cursor()
+        cur.execute(ORDERS_QUERY.format(where=where), values)
+        rows = cur.fetchall()
+        conn.rollback()
+        cur.close()
+
+    if order_number:
+        if not rows:
+            return runtime.error(404, 'Order not found')
+        return runtime.json_response(200, {'order': to_order(rows[0], staff)}, headers={'Cache-Control': 'no-store'})
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][5], rows[-1][0])
+
+    return runtime.json_response(200, {
+        'orders': [to_order(row, True) for row in rows],
+        'limit': limit,
+        'next_cursor': next_cursor
+    }, headers={'Cache-Control': 'no-store'})
@@ -0,0 +1,354 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from . import timing
+
+POOL_MAX_CONNECTIONS = int(os.environ.get('DB_POOL_MAX', '10'))
+POOL_MAX_AGE_SECONDS = float(os.environ.get('DB_POOL_MAX_AGE', '300'))
+POOL_CHECK_IDLE_SECONDS = float(os.environ.get('DB_POOL_CHECK_IDLE', '30'))
+
+READ_URLS = [url.strip() for url in os.environ.get('DATABASE_READ_URLS', '').split(',') if url.strip()]
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('DB_REPLICA_MAX_LAG', '5'))
+REPLICA_LAG_CHECK_SECONDS = float(os.environ.get('DB_REPLICA_LAG_CHECK', '5'))
+REPLICA_RETRY_SECONDS = float(os.environ.get('DB_REPLICA_RETRY', '30'))
+
+REPLICA_LAG_QUERY = '''
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+'''
+
+
+class PoolExhausted(Exception):
+    '''Все соединения пула заняты'''
+
+
+def driver():
+    '''psycopg2 загружается при первом обращении к БД, а не при импорте модуля'''
+    import psycopg2
+    import psycopg2.extensions
+    import psycopg2.pool
+    return psycopg2
+
+
+class ConnectionPool:
+    '''Пул соединений, переживающий тёплые вызовы функции.
+
+    Соединение старше max_age закрывается и заменяется новым; соединение,
+    простоявшее дольше check_idle, перед выдачей проверяется через SELECT 1.
+    '''
+
+    def __init__(self, dsn, maxconn=POOL_MAX_CONNECTIONS, max_age=POOL_MAX_AGE_SECONDS,
+                 check_idle=POOL_CHECK_IDLE_SECONDS):
+        self.dsn = dsn
+        self.max_age = max_age
+        self.check_idle = check_idle
+        self._pool = driver().pool.ThreadedConnectionPool(0, maxconn, dsn)
+        self._lock = threading.Lock()
+        self._opened_at = {}
+        self._returned_at = {}
+        self._timeouts = {}
+        self._stats = {'hits': 0, 'misses': 0, 'recycled': 0, 'broken': 0}
+
+    def getconn(self):
+        while True:
+            try:
+                conn = self._pool.getconn()
+            except driver().pool.PoolError as e:
+                raise PoolExhausted(str(e))
+            key = id(conn)
+            now = time.monotonic()
+
+            with self._lock:
+                opened_at = self._opened_at.get(key)
+                if opened_at is None:
+                    self._opened_at[key] = now
+                    self._stats['misses'] += 1
+                    return conn
+
+            if now - opened_at > self.max_age:
+                self._discard(conn, 'recycled')
+                continue
+
+            idle_since = self._returned_at.get(key, opened_at)
+            if now - idle_since > self.check_idle and not self._is_alive(conn):
+                self._discard(conn, 'broken')
+                continue
+
+            with self._lock:
+                self._stats['hits'] += 1
+            return conn
+
+    def putconn(self, conn, broken=False):
+        psycopg2 = driver()
+        if broken or conn.closed:
+            self._discard(conn, 'broken')
+            return
+
+        try:
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error:
+            self._discard(conn, 'broken')
+            return
+
+        self._returned_at[id(conn)] = time.monotonic()
+        self._pool.putconn(conn)
+
+    def set_statement_timeout(self, conn, timeout_ms):
+        '''Выставить statement_timeout соединению; SET выполняется только при смене значения'''
+        key = id(conn)
+        if self._timeouts.get(key) == timeout_ms:
+            return
+        cur = conn.cursor()
+        cur.execute('SET statement_timeout = %s', (int(timeout_ms),))
+        cur.close()
+        conn.commit()
+        self._timeouts[key] = timeout_ms
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['open'] = len(self._opened_at)
+        total = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / total, 4) if total else 0.0
+        return stats
+
+    def closeall(self):
+        self._pool.closeall()
+        with self._lock:
+            self._opened_at.clear()
+            self._returned_at.clear()
+            self._timeouts.clear()
+
+    def _is_alive(self, conn):
+        psycopg2 = driver()
+        if conn.closed:
+            return False
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.fetchone()
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn, reason):
+        key = id(conn)
+        with self._lock:
+            self._opened_at.pop(key, None)
+            self._returned_at.pop(key, None)
+            self._timeouts.pop(key, None)
+            self._stats[reason] += 1
+        try:
+            self._pool.putconn(conn, close=True)
+        except driver().pool.PoolError:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(dsn):
+    pool = _pools.get(dsn)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(dsn)
+            if pool is None:
+                pool = ConnectionPool(dsn)
+                _pools[dsn] = pool
+    return pool
+
+
+def replica_lag(conn):
+    '''Отставание реплики в секундах; 0 для primary и для реплики без непроигранного WAL'''
+    cur = conn.cursor()
+    cur.execute(REPLICA_LAG_QUERY)
+    lag = float(cur.fetchone()[0])
+    cur.close()
+    conn.rollback()
+    return lag
+
+
+class ReplicaSet:
+    '''Реплики для чтения: round-robin, отсев отстающих и недоступных.
+
+    Отставание проверяется не чаще раза в lag_check секунд на реплику;
+    реплика, к которой не удалось подключиться, пропускается retry_after секунд.
+    '''
+
+    def __init__(self, urls, max_lag=REPLICA_MAX_LAG_SECONDS, lag_check=REPLICA_LAG_CHECK_SECONDS,
+                 retry_after=REPLICA_RETRY_SECONDS, probe=replica_lag):
+        self.urls = list(urls)
+        self.max_lag = max_lag
+        self.lag_check = lag_check
+        self.retry_after = retry_after
+        self.probe = probe
+        self._next = 0
+        self._lag = {}
+        self._down_until = {}
+        self._lock = threading.Lock()
+        self._stats = {'replica': 0, 'primary': 0, 'lagging': 0, 'failed': 0}
+
+    def candidates(self):
+        '''Реплики в порядке опроса, начиная со следующей по кругу; недоступные пропускаются'''
+        now = time.monotonic()
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.urls)
+        ordered = self.urls[start:] + self.urls[:start]
+        return [url for url in ordered if self._down_until.get(url, 0) <= now]
+
+    def is_fresh(self, url, conn):
+        now = time.monotonic()
+        checked = self._lag.get(url)
+        if checked is None or now - checked[0] > self.lag_check:
+            checked = (now, self.probe(conn))
+            self._lag[url] = checked
+        if checked[1] > self.max_lag:
+            self.count('lagging')
+            return False
+        return True
+
+    def mark_down(self, url):
+        with self._lock:
+            self._down_until[url] = time.monotonic() + self.retry_after
+            self._lag.pop(url, None)
+            self._stats['failed'] += 1
+
+    def count(self, route):
+        with self._lock:
+            self._stats[route] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['lag_seconds'] = {dsn_key(url): lag for url, (_, lag) in self._lag.items()}
+        return stats
+
+
+_replicas = ReplicaSet(READ_URLS) if READ_URLS else None
+
+
+def configure_replicas(urls, **options):
+    '''Задать реплики для read_connection; пустой список отключает маршрутизацию'''
+    global _replicas
+    _replicas = ReplicaSet(urls, **options) if urls else None
+    return _replicas
+
+
+def replica_connection():
+    '''Вернуть (пул, соединение) свежей реплики или (None, None), если подходящей нет'''
+    psycopg2 = driver()
+    replicas = _replicas
+    if replicas is None:
+        return None, None
+
+    for url in replicas.candidates():
+        pool = get_pool(url)
+        try:
+            conn = pool.getconn()
+        except psycopg2.OperationalError:
+            replicas.mark_down(url)
+            continue
+        try:
+            fresh = replicas.is_fresh(url, conn)
+        except psycopg2.Error:
+            pool.putconn(conn, broken=True)
+            replicas.mark_down(url)
+            continue
+        if fresh:
+            replicas.count('replica')
+            return pool, conn
+        pool.putconn(conn)
+
+    replicas.count('primary')
+    return None, None
+
+
+@contextmanager
+def connection(dsn, statement_timeout=None):
+    '''Взять соединение из пула и вернуть его после использования'''
+    with timing.phase('connect'):
+        pool = get_pool(dsn)
+        conn = pool.getconn()
+    with _lease(pool, conn, statement_timeout):
+        yield conn
+
+
+@contextmanager
+def read_connection(dsn, statement_timeout=None):
+    '''Соединение для чистого чтения: реплика из DATABASE_READ_URLS, иначе primary dsn.
+
+    Записи и чтение только что записанного должны идти через connection().
+    '''
+    with timing.phase('connect'):
+        pool, conn = replica_connection()
+        if conn is None:
+            pool = get_pool(dsn)
+            conn = pool.getconn()
+    with _lease(pool, conn, statement_timeout):
+        yield conn
+
+
+@contextmanager
+def _lease(pool, conn, statement_timeout=None):
+    psycopg2 = driver()
+    if timing.instrumented():
+        conn.cursor_factory = timing.cursor_class()
+    broken = False
+    try:
+        if statement_timeout is not None:
+            pool.set_statement_timeout(conn, statement_timeout)
+        yield conn
+    except psycopg2.extensions.QueryCanceledError:
+        raise
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    finally:
+        pool.putconn(conn, broken=broken)
+
+
+def stats():
+    '''Счётчики попаданий/промахов по всем пулам процесса'''
+    return {dsn_key(dsn): pool.stats() for dsn, pool in _pools.items()}
+
+
+def is_query_canceled(error):
+    '''Ошибка statement_timeout или отмены запроса; драйвер не загружается ради проверки'''
+    psycopg2 = sys.modules.get('psycopg2')
+    return psycopg2 is not None and isinstance(error, psycopg2.extensions.QueryCanceledError)
+
+
+def replica_stats():
+    return _replicas.stats() if _replicas is not None else None
+
+
+def dsn_key(dsn):
+    '''DSN без пароля, пригодный для логов и метрик'''
+    params = driver().extensions.parse_dsn(dsn)
+    return f"{params.get('host', 'localhost')}:{params.get('port', '5432')}/{params.get('dbname', '')}"
+
+
+def count_rows(cur, query, values):
+    cur.execute(f'SELECT COUNT(*) FROM ({query}) as filtered', values)
+    return cur.fetchone()[0]
+
+
+def estimate_rows(cur, query, values):
+    '''Оценка числа строк по плану запроса, без его выполнения'''
+    cur.execute(f'EXPLAIN (FORMAT JSON) {query}', values)
+    plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
@@ -0,0 +1,150 @@
+import json
+import os
+import re
+from shared import db, runtime, stock, yookassa
+
+PAYMENT_ID_PATTERN = re.compile(r'^[0-9A-Za-z-]{1,64}$')
+
+ORDER_STATUS_BY_PAYMENT = {'succeeded': 'paid', 'canceled': 'canceled'}
+
+RECONCILE_BATCH_SIZE = int(os.environ.get('RECONCILE_BATCH_SIZE', '100'))
+RECONCILE_CONCURRENCY = int(os.environ.get('RECONCILE_CONCURRENCY', '8'))
+RECONCILE_MAX_BATCHES = int(os.environ.get('RECONCILE_MAX_BATCHES', '10'))
+RECONCILE_MIN_AGE_MINUTES = int(os.environ.get('RECONCILE_MIN_AGE_MINUTES', '10'))
+
+STALE_PENDING_QUERY = '''
+    SELECT payment_id FROM orders
+    WHERE payment_status = 'pending' AND payment_id IS NOT NULL
+      AND created_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 minute'
+      AND payment_id > %s
+    ORDER BY payment_id
+    LIMIT %s
+'''
+
+APPLY_STATUSES_QUERY = '''
+    UPDATE orders o
+    SET payment_status = v.payment_status,
+        status = COALESCE(v.order_status, o.status),
+        updated_at = CURRENT_TIMESTAMP
+    FROM (VALUES %s) AS v(payment_id, payment_status, order_status)
+    WHERE o.payment_id = v.payment_id
+      AND o.payment_status NOT IN ('succeeded', 'canceled')
+      AND o.payment_status IS DISTINCT FROM v.payment_status
+    RETURNING o.id, o.payment_id, o.payment_status
+'''
+
+
+def apply_statuses(cur, statuses):
+    '''Записать статусы платежей одним UPDATE ... FROM (VALUES ...); финальные статусы не перезаписываются'''
+    from psycopg2.extras import execute_values
+    if not statuses:
+        return []
+    rows = [(payment_id, status, ORDER_STATUS_BY_PAYMENT.get(status)) for payment_id, status in statuses]
+    return execute_values(cur, APPLY_STATUSES_QUERY, rows, template='(%s, %s, %s)', page_size=len(rows), fetch=True)
+
+
+def fetch_statuses(client, payment_ids, concurrency):
+    '''Запросить статусы у провайдера с ограниченным параллелизмом; недоступные платежи пропускаются'''
+    from concurrent.futures import ThreadPoolExecutor
+
+    def fetch(payment_id):
+        try:
+            return payment_id, client.get_payment(payment_id).get('status')
+        except yookassa.GatewayError:
+            return payment_id, None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(payment_ids)))) as executor:
+        results = executor.map(fetch, payment_ids)
+        return [(payment_id, status) for payment_id, status in results if status and status != 'pending']
+
+
+def reconcile(dsn, client, min_age_minutes=RECONCILE_MIN_AGE_MINUTES, batch_size=RECONCILE_BATCH_SIZE,
+              concurrency=RECONCILE_CONCURRENCY, max_batches=RECONCILE_MAX_BATCHES):
+    '''Сверить зависшие pending-заказы с провайдером пачками и снять просроченные резервы'''
+    checked = 0
+    updated = 0
+    last_payment_id = ''
+
+    with db.connection(dsn) as conn:
+        cur = conn.cursor()
+        expired = len(stock.expire(cur))
+        conn.commit()
+        cur.close()
+
+    for _ in range(max_batches):
+        with db.connection(dsn) as conn:
+            cur = conn.cursor()
+            cur.execute(STALE_PENDING_QUERY, (min_age_minutes, last_payment_id, batch_size))
+            payment_ids = [row[0] for row in cur.fetchall()]
+            conn.rollback()
+            cur.close()
+
+        if not payment_ids:
+            break
+
+        checked += len(payment_ids)
+        last_payment_id = payment_ids[-1]
+        statuses = fetch_statuses(client, payment_ids, concurrency)
+
+        if statuses:
+            with db.connection(dsn) as conn:
+                cur = conn.cursor()
+                changed = apply_statuses(cur, statuses)
+                stock.apply_payment_statuses(cur, changed)
+                updated += len(changed)
+                conn.commit()
+                cur.close()
+
+        if len(payment_ids) < batch_size:
+            break
+
+    return {'checked': checked, 'updated': updated, 'expired': expired}
+
+
+@runtime.route(['POST'], allow_headers='Content-Type, X-Reconcile-Token')
+def handler(event, context):
+    '''Приём уведомлений ЮKassa о статусе платежа и сверка зависших заказов'''
+
+    shop_id = os.environ.get('YOOKASSA_SHOP_ID')
+    secret_key = os.environ.get('YOOKASSA_SECRET_KEY')
+    dsn = os.environ.get('DATABASE_URL')
+
+    if not shop_id or not secret_key or not dsn:
+        return runtime.error(500, 'Payment credentials or DATABASE_URL not configured')
+
+    client = yookassa.get_client(shop_id, secret_key)
+    params = event.get('queryStringParameters') or {}
+
+    if params.get('action') == 'reconcile':
+        token = os.environ.get('RECONCILE_TOKEN')
+        headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+        if not token or headers.get('x-reconcile-token') != token:
+            return runtime.error(403, 'Forbidden')
+
+        return runtime.json_response(200, reconcile(dsn, client))
+
+    try:
+        notification = json.loads(event.get('body') or '{}')
+        payment_id = notification['object']['id']
+        if not isinstance(payment_id, str) or not PAYMENT_ID_PATTERN.match(payment_id):
+            raise ValueError(payment_id)
+    except (ValueError, KeyError, TypeError):
+        return runtime.error(400, 'Invalid notification')
+
+    try:
+        status = client.get_payment(payment_id).get('status')
+    except yookassa.GatewayError as e:
+        if e.status == 404:
+            return runtime.error(400, 'Unknown payment')
+        return runtime.error(502, 'Payment provider unavailable')
+
+    updated = []
+    if status and status != 'pending':
+        with db.connection(dsn) as conn:
+            cur = conn.cursor()
+            updated = apply_statuses(cur, [(payment_id, status)])
+            stock.apply_payment_statuses(cur, updated)
+            conn.commit()
+            cur.close()
+
+    return runtime.json_response(200, {'paymentId': payment_id, 'status': status, 'updated': len(updated)})
@@ -0,0 +1,260 @@
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from . import db
+
+CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '1024'))
+CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+VERSION_CHECK_SECONDS = float(os.environ.get('RESPONSE_CACHE_VERSION_CHECK', '5'))
+
+VERSIONS_QUERY = 'SELECT name, version FROM data_versions WHERE name = ANY(%s)'
+BUMP_QUERY = 'UPDATE data_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = ANY(%s)'
+
+_caches = {}
+
+
+class ResponseCache:
+    '''Ограниченный по размеру LRU-кэш тел ответов с TTL.
+
+    Если заданы versions, кэш сбрасывается при смене этих строк в
+    data_versions — так запись, сделанная из другого процесса, видна
+    не позже чем через VERSION_CHECK_SECONDS, а не через TTL. Версии
+    читаются с того же источника, что и данные (read_connection), так что
+    отставание реплики не приводит к кэшированию старых данных под новой
+    версией.
+    '''
+
+    def __init__(self, name, ttl, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, versions=()):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.versions = list(versions)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._seen_versions = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'not_modified': 0, 'evictions': 0, 'expired': 0, 'invalidations': 0}
+        _caches[name] = self
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry
+
+    def put(self, key, body):
+        etag = '"' + hashlib.sha1(body.encode('utf-8')).hexdigest() + '"'
+        size = len(body.encode('utf-8'))
+        if size > self.max_bytes:
+            return etag
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, etag, body, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+        return etag
+
+    def sync(self, dsn):
+        '''Сверить версии в data_versions не чаще раза в VERSION_CHECK_SECONDS; при смене очистить кэш'''
+        if not self.versions or not dsn or self.max_entries <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked_at < VERSION_CHECK_SECONDS:
+                return
+            self._checked_at = now
+
+        psycopg2 = db.driver()
+        try:
+            with db.read_connection(dsn) as conn:
+                cur = conn.cursor()
+                cur.execute(VERSIONS_QUERY, (self.versions,))
+                versions = dict(cur.fetchall())
+                cur.close()
+                conn.rollback()
+        except psycopg2.Error:
+            # Без data_versions кэш живёт только по TTL
+            return
+
+        with self._lock:
+            if self._seen_versions is not None and versions != self._seen_versions:
+                self._entries.clear()
+                self._bytes = 0
+                self._stats['invalidations'] += 1
+            self._seen_versions = versions
+
+    def count_not_modified(self):
+        with self._lock:
+            self._stats['not_modified'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        total = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / total, 4) if total else 0.0
+        return stats
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry[3]
+
+
+class ItemCache:
+    '''LRU-кэш отдельных записей по ключу с коротким TTL'''
+
+    def __init__(self, ttl, max_entries=CACHE_MAX_ENTRIES * 16):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def get_many(self, keys):
+        '''Вернуть (найденные {key: value}, список отсутствующих ключей)'''
+        found = {}
+        missing = []
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] >= now:
+                    self._entries.move_to_end(key)
+                    found[key] = entry[1]
+                else:
+                    missing.append(key)
+            self._stats['hits'] += len(found)
+            self._stats['misses'] += len(missing)
+        return found, missing
+
+    def put_many(self, items):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for key, value in items.items():
+                self._entries[key] = (expires_at, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        total = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / total, 4) if total else 0.0
+        return stats
+
+
+def cache_key(event):
+    '''Ключ кэша по нормализованным queryStringParameters'''
+    params = event.get('queryStringParameters') or {}
+    return json.dumps(sorted((k, str(v)) for k, v in params.items()), ensure_ascii=False)
+
+
+def header(event, name):
+    headers = event.get('headers') or {}
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def cached(cache):
+    '''Кэширует успешные GET-ответы обработчика; If-None-Match на закэшированный ответ отдаёт 304.
+
+    БД при этом затрагивается только периодической сверкой версий (sync).
+    '''
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            if event.get('httpMethod', 'GET') != 'GET':
+                return handler(event, context)
+
+            cache.sync(os.environ.get('DATABASE_URL'))
+            key = cache_key(event)
+            entry = cache.get(key)
+            if entry is not None:
+                etag, body = entry[1], entry[2]
+                if header(event, 'If-None-Match') == etag:
+                    cache.count_not_modified()
+                    return _response(304, '', etag, cache.ttl, 'HIT')
+                return _response(200, body, etag, cache.ttl, 'HIT')
+
+            response = handler(event, context)
+            if response.get('statusCode') != 200 or 'no-store' in response.get('headers', {}).get('Cache-Control', ''):
+                return response
+
+            etag = cache.put(key, response['body'])
+            response['headers'] = {
+                **response.get('headers', {}),
+                'ETag': etag,
+                'Cache-Control': f'public, max-age={int(cache.ttl)}',
+                'X-Cache': 'MISS'
+            }
+            if header(event, 'If-None-Match') == etag:
+                cache.count_not_modified()
+                return _response(304, '', etag, cache.ttl, 'MISS')
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _response(status, body, etag, ttl, state):
+    headers = {
+        'Access-Control-Allow-Origin': '*',
+        'ETag': etag,
+        'Cache-Control': f'public, max-age={int(ttl)}',
+        'X-Cache': state
+    }
+    if body:
+        headers['Content-Type'] = 'application/json'
+    return {'statusCode': status, 'headers': headers, 'body': body}
+
+
+def bump(cur, *names):
+    '''Увеличить версии в data_versions в транзакции cur; кэши с этими versions сбросятся во всех процессах'''
+    cur.execute(BUMP_QUERY, (list(names),))
+
+
+def invalidate(*names):
+    '''Сбросить кэши процесса по именам (все, если имена не заданы)'''
+    for name, cache in _caches.items():
+        if not names or name in names:
+            cache.clear()
+
+
+def stats():
+    return {name: cache.stats() for name, cache in _caches.items()}
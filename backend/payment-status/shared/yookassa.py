@@ -0,0 +1,146 @@
+import base64
+import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+API_URL = os.environ.get('YOOKASSA_API_URL', 'https://api.yookassa.ru/v3')
+CONNECT_TIMEOUT = float(os.environ.get('YOOKASSA_CONNECT_TIMEOUT', '3'))
+READ_TIMEOUT = float(os.environ.get('YOOKASSA_READ_TIMEOUT', '10'))
+MAX_RETRIES = int(os.environ.get('YOOKASSA_MAX_RETRIES', '2'))
+RETRY_BACKOFF = float(os.environ.get('YOOKASSA_RETRY_BACKOFF', '0.2'))
+POOL_SIZE = int(os.environ.get('YOOKASSA_POOL_SIZE', '8'))
+
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+
+class GatewayError(Exception):
+    '''Ошибка платёжного провайдера; status = None для сетевых ошибок и таймаутов'''
+
+    def __init__(self, message, status=None, body=''):
+        super().__init__(message)
+        self.status = status
+        self.body = body
+
+
+class YooKassaClient:
+    '''Клиент API ЮKassa с пулом keep-alive соединений, таймаутами и повторами.
+
+    Повторные попытки отправляются с тем же Idempotence-Key, поэтому провайдер
+    не создаст второй платёж, если первый ответ потерялся в сети.
+    '''
+
+    def __init__(self, shop_id, secret_key, api_url=API_URL, connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT, max_retries=MAX_RETRIES, backoff=RETRY_BACKOFF, pool_size=POOL_SIZE):
+        url = urlsplit(api_url)
+        self.scheme = url.scheme
+        self.host = url.hostname
+        self.port = url.port
+        self.base_path = url.path.rstrip('/')
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self._auth = 'Basic ' + base64.b64encode(f'{shop_id}:{secret_key}'.encode('utf-8')).decode('utf-8')
+        self._idle = []
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'reused': 0, 'connects': 0, 'retries': 0}
+
+    def create_payment(self, payload, idempotence_key):
+        return self._request('POST', '/payments', payload, idempotence_key)
+
+    def get_payment(self, payment_id):
+        return self._request('GET', f'/payments/{payment_id}')
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def _request(self, method, path, payload=None, idempotence_key=None):
+        import http.client
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        headers = {'Authorization': self._auth, 'Content-Type': 'application/json'}
+        if idempotence_key:
+            headers['Idempotence-Key'] = idempotence_key
+
+        attempt = 0
+        while True:
+            try:
+                status, data = self._send(method, self.base_path + path, body, headers)
+            except (OSError, http.client.HTTPException) as e:
+                if attempt >= self.max_retries:
+                    raise GatewayError(f'Payment provider unavailable: {e}')
+            else:
+                if status < 400:
+                    return json.loads(data.decode('utf-8')) if data else {}
+                if status not in RETRYABLE_STATUSES or attempt >= self.max_retries:
+                    raise GatewayError('Payment provider error', status, data.decode('utf-8', 'replace'))
+
+            attempt += 1
+            with self._lock:
+                self._stats['retries'] += 1
+            time.sleep(self.backoff * (2 ** (attempt - 1)))
+
+    def _send(self, method, path, body, headers):
+        conn = self._acquire()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+        except BaseException:
+            conn.close()
+            raise
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+        return response.status, data
+
+    def _acquire(self):
+        with self._lock:
+            self._stats['requests'] += 1
+            if self._idle:
+                self._stats['reused'] += 1
+                return self._idle.pop()
+            self._stats['connects'] += 1
+
+        import http.client
+        import socket
+
+        connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        conn = connection_class(self.host, self.port, timeout=self.connect_timeout)
+        conn.connect()
+        conn.sock.settimeout(self.read_timeout)
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn
+
+    def _release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(shop_id, secret_key):
+    '''Клиент на процесс, чтобы keep-alive соединения переживали тёплые вызовы'''
+    key = (shop_id, secret_key, API_URL)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = YooKassaClient(shop_id, secret_key)
+            _clients[key] = client
+    return client
@@ -1,52 +1,112 @@
 import json
 import os
-import psycopg2
+from decimal import Decimal
 import uuid
-import base64
-import urllib.request
-import urllib.error
+from shared import db, runtime, stock, yookassa
 
+MAX_ORDER_ITEMS = 1000
+MAX_ITEM_QUANTITY = int(os.environ.get('MAX_ITEM_QUANTITY', '10000'))
+MAX_INT4 = 2 ** 31 - 1
+
+PRICE_LOOKUP_QUERY = '''
+    SELECT 'product', id, price, name FROM products WHERE id = ANY(%s) AND is_active = true
+    UNION ALL
+    SELECT 'service', id, price, name FROM services WHERE id = ANY(%s) AND is_active = true
+'''
+
+ORDER_WRITE_QUERY = '''
+    WITH new_order AS (
+        INSERT INTO orders (order_number, customer_name, customer_email, customer_phone, total_amount, status, payment_status,
+                            stock_reserved, reserved_until)
+        VALUES (%s, %s, %s, %s, %s, 'pending', 'pending', %s, CURRENT_TIMESTAMP + %s * INTERVAL '1 minute')
+        RETURNING id
+    )
+    INSERT INTO order_items (order_id, product_id, service_id, quantity, price)
+    SELECT new_order.id, v.product_id, v.service_id, v.quantity, v.price
+    FROM new_order, unnest(%s::integer[], %s::integer[], %s::integer[], %s::numeric[])
+        AS v(product_id, service_id, quantity, price)
+    RETURNING order_id
+'''
+
+
+def normalize_items(items):
+    '''Проверить позиции корзины: ровно один из productId/serviceId и количество 1..MAX_ITEM_QUANTITY.
+
+    id и количество уходят в запрос как integer[], поэтому значения вне int4
+    отклоняются здесь, а не ошибкой приведения в БД.
+    '''
+    if not isinstance(items, list) or not items or len(items) > MAX_ORDER_ITEMS:
+        raise ValueError('Invalid order data')
+    lines = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError('Invalid order data')
+        product_id = item.get('productId')
+        service_id = item.get('serviceId')
+        quantity = item.get('quantity', 1)
+        if (product_id is None) == (service_id is None):
+            raise ValueError('Each item needs exactly one of productId or serviceId')
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or not 0 < quantity <= MAX_ITEM_QUANTITY:
+            raise ValueError(f'Item quantity must be between 1 and {MAX_ITEM_QUANTITY}')
+        try:
+            line = (
+                int(product_id) if product_id is not None else None,
+                int(service_id) if service_id is not None else None,
+                quantity
+            )
+        except (TypeError, ValueError):
+            raise ValueError('Invalid item id')
+        if not 0 < (line[0] if line[0] is not None else line[1]) <= MAX_INT4:
+            raise ValueError('Invalid item id')
+        lines.append(line)
+    return lines
+
+
+def price_lines(cur, lines):
+    '''Подставить серверные цены одним запросом; вернуть (позиции с ценой и названием, неизвестные id)'''
+    product_ids = list({line[0] for line in lines if line[0] is not None})
+    service_ids = list({line[1] for line in lines if line[1] is not None})
+    cur.execute(PRICE_LOOKUP_QUERY, (product_ids, service_ids))
+    
+    catalog = {}
+    for kind, item_id, price, name in cur.fetchall():
+        catalog[(kind, item_id)] = (price, name)
+    
+    priced = []
+    missing = []
+    for product_id, service_id, quantity in lines:
+        key = ('product', product_id) if product_id is not None else ('service', service_id)
+        if key not in catalog:
+            missing.append({'type': key[0], 'id': key[1]})
+            continue
+        price, name = catalog[key]
+        priced.append((product_id, service_id, quantity, price, name))
+    return priced, missing
+
+
+def write_order(cur, order_number, customer, priced, total, reserved=False):
+    '''Записать заказ и все его позиции одним запросом; вернуть id заказа'''
+    columns = list(zip(*[line[:4] for line in priced]))
+    cur.execute(ORDER_WRITE_QUERY, (
+        order_number, *customer, total, reserved, stock.RESERVATION_MINUTES, *[list(c) for c in columns]
+    ))
+    return cur.fetchone()[0]
+
+
+@runtime.route(['POST'])
 def handler(event, context):
     '''Создание платежа через ЮKassa и сохранение заказа'''
     
-    method = event.get('httpMethod', 'POST')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
-            },
-            'body': ''
-        }
-    
-    if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
-    
     shop_id = os.environ.get('YOOKASSA_SHOP_ID')
     secret_key = os.environ.get('YOOKASSA_SECRET_KEY')
     
     if not shop_id or not secret_key:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Payment credentials not configured'})
-        }
+        return runtime.error(500, 'Payment credentials not configured')
     
     try:
         body = json.loads(event.get('body', '{}'))
     except:
-        return {
-            'statusCode': 400,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Invalid JSON'})
-        }
+        return runtime.error(400, 'Invalid JSON')
     
     customer_name = body.get('customerName', '')
     customer_email = body.get('customerEmail', '')
@@ -54,45 +114,45 @@ def handler(event, context):
     items = body.get('items', [])
     total_amount = body.get('totalAmount', 0)
     
-    if not items or total_amount <= 0:
-        return {
-            'statusCode': 400,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Invalid order data'})
-        }
+    try:
+        lines = normalize_items(items)
+    except ValueError as e:
+        return runtime.error(400, str(e))
+    
+    if not isinstance(total_amount, (int, float)) or total_amount <= 0:
+        return runtime.error(400, 'Invalid order data')
     
     dsn = os.environ.get('DATABASE_URL')
     if not dsn:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'DATABASE_URL not configured'})
-        }
-    
-    conn = psycopg2.connect(dsn)
-    cur = conn.cursor()
-    
-    order_number = f'ORD-{uuid.uuid4().hex[:8].upper()}'
-    
-    cur.execute(
-        '''INSERT INTO orders (order_number, customer_name, customer_email, customer_phone, total_amount, status, payment_status)
-           VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id''',
-        (order_number, customer_name, customer_email, customer_phone, total_amount, 'pending', 'pending')
-    )
-    order_id = cur.fetchone()[0]
+        return runtime.error(500, 'DATABASE_URL not configured')
     
-    for item in items:
-        product_id = item.get('productId')
-        service_id = item.get('serviceId')
-        quantity = item.get('quantity', 1)
-        price = item.get('price', 0)
+    with db.connection(dsn) as conn:
+        cur = conn.cursor()
         
-        cur.execute(
-            'INSERT INTO order_items (order_id, product_id, service_id, quantity, price) VALUES (%s, %s, %s, %s, %s)',
-            (order_id, product_id, service_id, quantity, price)
-        )
-    
-    conn.commit()
+        priced, missing = price_lines(cur, lines)
+        if missing:
+            cur.close()
+            return runtime.error(400, 'Unknown or inactive items', items=missing)
+        
+        server_total = sum(line[3] * line[2] for line in priced)
+        if abs(server_total - Decimal(str(total_amount))) > Decimal('0.01'):
+            cur.close()
+            return runtime.error(409, 'Prices have changed', totalAmount=float(server_total))
+        total_amount = server_total
+        
+        shortages = stock.reserve(cur, priced)
+        if shortages:
+            conn.rollback()
+            cur.close()
+            return runtime.error(409, 'Insufficient stock', items=shortages)
+        
+        order_number = f'ORD-{uuid.uuid4().hex[:8].upper()}'
+        customer = (customer_name, customer_email, customer_phone)
+        reserved = any(line[0] is not None for line in priced)
+        order_id = write_order(cur, order_number, customer, priced, total_amount, reserved)
+        
+        conn.commit()
+        cur.close()
     
     idempotence_key = str(uuid.uuid4())
     
@@ -119,76 +179,49 @@ def handler(event, context):
             'items': []
         }
         
-        for item in items:
+        for product_id, service_id, quantity, price, name in priced:
             payment_data['receipt']['items'].append({
-                'description': item.get('name', 'Товар'),
-                'quantity': str(item.get('quantity', 1)),
+                'description': name,
+                'quantity': str(quantity),
                 'amount': {
-                    'value': f"{item.get('price', 0):.2f}",
+                    'value': f'{price:.2f}',
                     'currency': 'RUB'
                 },
                 'vat_code': 1
             })
     
+    client = yookassa.get_client(shop_id, secret_key)
+    
     try:
-        auth_string = f'{shop_id}:{secret_key}'
-        auth_bytes = auth_string.encode('utf-8')
-        auth_base64 = base64.b64encode(auth_bytes).decode('utf-8')
-        
-        req = urllib.request.Request(
-            'https://api.yookassa.ru/v3/payments',
-            data=json.dumps(payment_data).encode('utf-8'),
-            headers={
-                'Authorization': f'Basic {auth_base64}',
-                'Content-Type': 'application/json',
-                'Idempotence-Key': idempotence_key
-            }
-        )
-        
-        with urllib.request.urlopen(req) as response:
-            payment_response = json.loads(response.read().decode('utf-8'))
-        
-        payment_id = payment_response.get('id')
-        confirmation_url = payment_response.get('confirmation', {}).get('confirmation_url')
-        
+        payment_response = client.create_payment(payment_data, idempotence_key)
+    except yookassa.GatewayError as e:
+        with db.connection(dsn) as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "UPDATE orders SET status = 'canceled', payment_status = 'canceled' WHERE id = %s",
+                (order_id,)
+            )
+            stock.release(cur, [order_id])
+            conn.commit()
+            cur.close()
+        return runtime.error(500, 'Payment creation failed', details=e.body or str(e))
+    
+    payment_id = payment_response.get('id')
+    confirmation_url = payment_response.get('confirmation', {}).get('confirmation_url')
+    
+    with db.connection(dsn) as conn:
+        cur = conn.cursor()
         cur.execute(
             'UPDATE orders SET payment_id = %s WHERE id = %s',
             (payment_id, order_id)
         )
         conn.commit()
-        
         cur.close()
-        conn.close()
-        
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({
-                'success': True,
-                'orderId': order_id,
-                'orderNumber': order_number,
-                'paymentId': payment_id,
-                'confirmationUrl': confirmation_url
-            })
-        }
     
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode('utf-8')
-        cur.close()
-        conn.close()
-        
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Payment creation failed', 'details': error_body})
-        }
-    
-    except Exception as e:
-        cur.close()
-        conn.close()
-        
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)})
-        }
+    return runtime.json_response(200, {
+        'success': True,
+        'orderId': order_id,
+        'orderNumber': order_number,
+        'paymentId': payment_id,
+        'confirmationUrl': confirmation_url
+    })
\ No newline at end of file
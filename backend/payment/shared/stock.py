@@ -0,0 +1,130 @@
+import os
+
+RESERVATION_MINUTES = int(os.environ.get('STOCK_RESERVATION_MINUTES', '30'))
+EXPIRE_BATCH_SIZE = int(os.environ.get('STOCK_EXPIRE_BATCH_SIZE', '500'))
+
+# Строки блокируются в порядке id, поэтому встречные корзины не взаимоблокируются;
+# условие stock_quantity >= quantity перепроверяется после ожидания блокировки.
+RESERVE_QUERY = '''
+    WITH wanted AS (
+        SELECT product_id, quantity
+        FROM unnest(%s::integer[], %s::integer[]) AS v(product_id, quantity)
+    ), locked AS (
+        SELECT p.id FROM products p
+        WHERE p.id IN (SELECT product_id FROM wanted)
+        ORDER BY p.id
+        FOR UPDATE
+    )
+    UPDATE products p
+    SET stock_quantity = p.stock_quantity - w.quantity
+    FROM wanted w
+    WHERE p.id = w.product_id
+      AND p.id IN (SELECT id FROM locked)
+      AND p.stock_quantity >= w.quantity
+    RETURNING p.id
+'''
+
+AVAILABLE_QUERY = 'SELECT id, stock_quantity FROM products WHERE id = ANY(%s)'
+
+RELEASE_QUERY = '''
+    WITH released AS (
+        UPDATE orders SET stock_reserved = false, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ANY(%s) AND stock_reserved = true
+        RETURNING id
+    ), returned AS (
+        SELECT oi.product_id, SUM(oi.quantity) AS quantity
+        FROM order_items oi
+        JOIN released r ON r.id = oi.order_id
+        WHERE oi.product_id IS NOT NULL
+        GROUP BY oi.product_id
+    ), locked AS (
+        SELECT p.id FROM products p
+        WHERE p.id IN (SELECT product_id FROM returned)
+        ORDER BY p.id
+        FOR UPDATE
+    )
+    UPDATE products p
+    SET stock_quantity = p.stock_quantity + returned.quantity
+    FROM returned
+    WHERE p.id = returned.product_id
+      AND p.id IN (SELECT id FROM locked)
+    RETURNING p.id
+'''
+
+SETTLE_QUERY = '''
+    UPDATE orders SET stock_reserved = false, updated_at = CURRENT_TIMESTAMP
+    WHERE id = ANY(%s) AND stock_reserved = true
+    RETURNING id
+'''
+
+EXPIRE_QUERY = '''
+    UPDATE orders SET status = 'canceled', payment_status = 'canceled', updated_at = CURRENT_TIMESTAMP
+    WHERE id IN (
+        SELECT id FROM orders
+        WHERE stock_reserved = true AND payment_id IS NULL AND reserved_until < CURRENT_TIMESTAMP
+        ORDER BY id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id
+'''
+
+
+def product_quantities(lines):
+    '''Сложить количества по товарам из строк (product_id, service_id, quantity, ...); услуги без остатков'''
+    totals = {}
+    for line in lines:
+        if line[0] is not None:
+            totals[line[0]] = totals.get(line[0], 0) + line[2]
+    product_ids = sorted(totals)
+    return product_ids, [totals[product_id] for product_id in product_ids]
+
+
+def reserve(cur, lines):
+    '''Списать остатки по всем товарам корзины одним UPDATE; вернуть нехватки.
+
+    Пустой список — резерв сделан. Иначе часть строк уже списана, и вызывающий
+    обязан откатить транзакцию: резерв либо целиком, либо никакой.
+    '''
+    product_ids, quantities = product_quantities(lines)
+    if not product_ids:
+        return []
+    cur.execute(RESERVE_QUERY, (product_ids, quantities))
+    reserved = {row[0] for row in cur.fetchall()}
+    if len(reserved) == len(product_ids):
+        return []
+
+    failed = {pid: qty for pid, qty in zip(product_ids, quantities) if pid not in reserved}
+    cur.execute(AVAILABLE_QUERY, (list(failed),))
+    available = dict(cur.fetchall())
+    return [{'id': pid, 'requested': qty, 'available': available.get(pid) or 0} for pid, qty in failed.items()]
+
+
+def release(cur, order_ids):
+    '''Вернуть на склад резервы заказов; повторный вызов для того же заказа ничего не делает'''
+    if not order_ids:
+        return 0
+    cur.execute(RELEASE_QUERY, (list(order_ids),))
+    return len(cur.fetchall())
+
+
+def settle(cur, order_ids):
+    '''Оплаченные заказы: резерв становится продажей, остатки не возвращаются'''
+    if not order_ids:
+        return 0
+    cur.execute(SETTLE_QUERY, (list(order_ids),))
+    return len(cur.fetchall())
+
+
+def expire(cur, limit=EXPIRE_BATCH_SIZE):
+    '''Отменить заказы, для которых платёж так и не был создан до reserved_until, и вернуть их резервы'''
+    cur.execute(EXPIRE_QUERY, (limit,))
+    order_ids = [row[0] for row in cur.fetchall()]
+    release(cur, order_ids)
+    return order_ids
+
+
+def apply_payment_statuses(cur, updated):
+    '''Отпустить или закрепить резервы по строкам (id, payment_id, payment_status) после смены статуса'''
+    release(cur, [row[0] for row in updated if row[2] == 'canceled'])
+    settle(cur, [row[0] for row in updated if row[2] == 'succeeded'])
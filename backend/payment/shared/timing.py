@@ -0,0 +1,156 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+ENABLED = os.environ.get('REQUEST_TIMING', '') in ('1', 'true')
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '0'))
+SLOW_QUERY_MAX_SQL = 2000
+
+_local = threading.local()
+_cursor_class = None
+
+
+class Timer:
+    '''Накопитель времени по фазам одного запроса: {фаза: [секунды, число вызовов]}'''
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+
+    def add(self, name, seconds):
+        entry = self.phases.get(name)
+        if entry is None:
+            self.phases[name] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        '''Значение заголовка Server-Timing'''
+        parts = [f'{name};dur={seconds * 1000:.2f}' + (f';desc="x{count}"' if count > 1 else '')
+                 for name, (seconds, count) in self.phases.items()]
+        parts.append(f'total;dur={self.elapsed() * 1000:.2f}')
+        return ', '.join(parts)
+
+    def summary(self):
+        return {name: {'ms': round(seconds * 1000, 3), 'count': count}
+                for name, (seconds, count) in self.phases.items()}
+
+
+class _Phase:
+    __slots__ = ('timer', 'name', 'started')
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.add(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class _NoopPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopPhase()
+
+
+def start():
+    '''Начать замер запроса в текущем потоке; None, если замеры выключены'''
+    if not ENABLED:
+        return None
+    timer = _local.timer = Timer()
+    return timer
+
+
+def finish():
+    timer = getattr(_local, 'timer', None)
+    _local.timer = None
+    return timer
+
+
+def current():
+    return getattr(_local, 'timer', None) if ENABLED else None
+
+
+def phase(name):
+    '''Контекстный менеджер фазы; без активного замера ничего не делает'''
+    timer = current()
+    if timer is None:
+        return _NOOP
+    return _Phase(timer, name)
+
+
+def instrumented():
+    '''Нужно ли оборачивать cursor.execute: включены замеры или журнал медленных запросов'''
+    return ENABLED or SLOW_QUERY_MS > 0
+
+
+def cursor_class():
+    '''Класс курсора psycopg2 с замером execute; создаётся при первом обращении'''
+    global _cursor_class
+    if _cursor_class is None:
+        import psycopg2.extensions
+
+        class TimedCursor(psycopg2.extensions.cursor):
+            def execute(self, query, vars=None):
+                started = time.perf_counter()
+                try:
+                    return super().execute(query, vars)
+                finally:
+                    record_query(query, vars, time.perf_counter() - started)
+
+        _cursor_class = TimedCursor
+    return _cursor_class
+
+
+def record_query(query, vars, seconds):
+    timer = current()
+    if timer is not None:
+        timer.add('db', seconds)
+    if SLOW_QUERY_MS > 0 and seconds * 1000 >= SLOW_QUERY_MS:
+        log('slow_query', ms=round(seconds * 1000, 3), sql=normalize_sql(query), params=params_shape(vars))
+
+
+def normalize_sql(query):
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    return re.sub(r'\s+', ' ', str(query)).strip()[:SLOW_QUERY_MAX_SQL]
+
+
+def params_shape(vars):
+    '''Типы параметров без значений: int, str, list[int]*12 ...'''
+    if vars is None:
+        return None
+    if isinstance(vars, dict):
+        return {key: _shape(value) for key, value in vars.items()}
+    return [_shape(value) for value in vars]
+
+
+def _shape(value):
+    if isinstance(value, (list, tuple)):
+        inner = type(value[0]).__name__ if value else ''
+        return f'list[{inner}]*{len(value)}'
+    return type(value).__name__
+
+
+def log(event, **fields):
+    '''Структурированная строка лога в stdout'''
+    sys.stdout.write(json.dumps({'event': event, **fields}, ensure_ascii=False, default=str) + '\n')
@@ -1,95 +1,260 @@
-import json
 import os
-import psycopg2
+import re
+from shared import admission, cache, db, runtime, snapshot
 
-def handler(event, context):
-    '''API для получения списка услуг с фильтрацией'''
-    
-    method = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
-            },
-            'body': ''
-        }
-    
-    if method != 'GET':
+SEARCH_RANK = "(ts_rank(search_vector, plainto_tsquery('russian', %s)) + similarity(name, %s))"
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = int(os.environ.get('SERVICES_MAX_LIMIT', '100'))
+STATEMENT_TIMEOUT_MS = admission.statement_timeout('services', 3000)
+
+SNAPSHOT_ENABLED = os.environ.get('SERVICES_SNAPSHOT', '1') != '0'
+
+SNAPSHOT_QUERY = '''
+    SELECT id, name, description, price::float8, category, duration_hours
+    FROM services WHERE is_active = true
+    ORDER BY category, price, id
+'''
+
+WORD_PATTERN = re.compile(r'\w+')
+SELECTION_CACHE_SIZE = 256
+
+RESPONSE_CACHE = cache.ResponseCache('services', ttl=60, versions=['services'])
+
+
+class ServiceColumns:
+    '''Активные услуги по колонкам в порядке (category, price)'''
+
+    __slots__ = ('ids', 'names', 'descriptions', 'prices', 'categories', 'durations',
+                 'search_names', 'search_words', 'by_category', 'selections')
+
+    def __init__(self, rows):
+        self.ids = [row[0] for row in rows]
+        self.names = [row[1] for row in rows]
+        self.descriptions = [row[2] for row in rows]
+        self.prices = [row[3] for row in rows]
+        self.categories = [row[4] for row in rows]
+        self.durations = [row[5] for row in rows]
+        self.search_names = [normalize(name) for name in self.names]
+        self.search_words = [WORD_PATTERN.findall(name) for name in self.search_names]
+        self.by_category = {}
+        for position, category in enumerate(self.categories):
+            self.by_category.setdefault(category, []).append(position)
+        self.selections = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def select(self, category, search):
+        '''Позиции под фильтр; результаты поиска запоминаются до следующей перезагрузки снимка'''
+        positions = self.by_category.get(category, []) if category else range(len(self))
+        if not search:
+            return positions
+        key = (category, search)
+        selected = self.selections.get(key)
+        if selected is None:
+            selected = search_positions(self, positions, search)
+            if len(self.selections) >= SELECTION_CACHE_SIZE:
+                self.selections.clear()
+            self.selections[key] = selected
+        return selected
+
+    def row(self, position):
         return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
+            'id': self.ids[position],
+            'name': self.names[position],
+            'description': self.descriptions[position],
+            'price': self.prices[position],
+            'category': self.categories[position],
+            'duration': self.durations[position]
         }
+
+
+def load_services(cur):
+    cur.execute(SNAPSHOT_QUERY)
+    return ServiceColumns(cur.fetchall())
+
+
+SNAPSHOT = snapshot.Snapshot('services', load_services)
+
+
+def normalize(text):
+    return text.lower().replace('ё', 'е')
+
+
+def stems(search):
+    '''Грубые основы слов запроса: длинные слова без двух последних букв (окончания)'''
+    return [word[:-2] if len(word) > 4 else word for word in WORD_PATTERN.findall(normalize(search))]
+
+
+def search_positions(columns, positions, search):
+    '''Отобрать и упорядочить позиции по запросу: подстрока (как ILIKE) или все основы слов (как tsquery)'''
+    needle = normalize(search)
+    prefixes = stems(search)
+    scored = []
+    for position in positions:
+        name = columns.search_names[position]
+        substring = needle in name
+        words = columns.search_words[position]
+        matched = sum(1 for prefix in prefixes if any(word.startswith(prefix) for word in words))
+        if substring or (prefixes and matched == len(prefixes)):
+            scored.append((-(substring + matched / max(1, len(prefixes))), position))
+    scored.sort(key=lambda item: item[0])
+    return [position for _, position in scored]
+
+
+def build_filters(category, search):
+    '''Условия WHERE и параметры для category/search'''
+    conditions = ['is_active = true']
+    values = []
+    if category:
+        conditions.append('category = %s')
+        values.append(category)
+    if search:
+        conditions.append("(search_vector @@ plainto_tsquery('russian', %s) OR name ILIKE %s)")
+        values.append(search)
+        values.append(f'%{search}%')
+    return conditions, values
+
+
+def page_query(conditions, filter_values, search, limit, offset, with_total=False):
+    '''SQL и параметры страницы услуг: страница и точный total выбираются по id, остальные колонки — только для неё'''
+    where = ' AND '.join(conditions)
+    if search:
+        columns = f'id, {SEARCH_RANK} as rank, category, price'
+        order_by = 'rank DESC, category, price, id'
+        values = [search, search]
+    else:
+        columns = 'id, 0::real as rank, category, price'
+        order_by = 'category, price, id'
+        values = []
+    if with_total:
+        columns += f', (SELECT COUNT(*) FROM services WHERE {where}) as total_count'
+        values.extend(filter_values)
+    else:
+        columns += ', NULL::bigint as total_count'
+    values.extend(filter_values + [limit, offset])
     
+    query = f'''
+        SELECT s.id, s.name, s.description, s.price, s.category, s.duration_hours, page.total_count
+        FROM (
+            SELECT {columns}
+            FROM services
+            WHERE {where}
+            ORDER BY {order_by}
+            LIMIT %s OFFSET %s
+        ) page
+        JOIN services s ON s.id = page.id
+        ORDER BY page.rank DESC, page.category, page.price, page.id
+    '''
+    return query, values
+
+
+def parse_request(event):
+    '''Параметры запроса или готовый ответ 400'''
     params = event.get('queryStringParameters') or {}
-    category = params.get('category', '')
-    search = params.get('search', '')
-    page = int(params.get('page', '1'))
-    limit = int(params.get('limit', '50'))
+    include_total = params.get('include_total', 'exact')
     
-    offset = (page - 1) * limit
+    try:
+        page, limit = admission.paging(params, DEFAULT_LIMIT, MAX_LIMIT)
+    except ValueError as e:
+        return None, runtime.error(400, str(e))
     
-    dsn = os.environ.get('DATABASE_URL')
-    if not dsn:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'DATABASE_URL not configured'})
-        }
+    if include_total not in ('exact', 'estimate', 'none'):
+        return None, runtime.error(400, 'include_total must be exact, estimate or none')
     
-    conn = psycopg2.connect(dsn)
-    cur = conn.cursor()
+    return (params.get('category', ''), params.get('search', ''), page, limit, include_total), None
+
+
+def snapshot_listing(dsn, category, search, page, limit, include_total):
+    '''Фильтрация, сортировка и страница по снимку в памяти, без обращения к БД'''
+    columns = SNAPSHOT.get(dsn)
+    positions = columns.select(category, search)
     
-    query = 'SELECT id, name, description, price, category, duration_hours FROM services WHERE is_active = true'
-    conditions = []
-    values = []
+    offset = (page - 1) * limit
+    services = [columns.row(position) for position in positions[offset:offset + limit]]
     
-    if category:
-        conditions.append('category = %s')
-        values.append(category)
+    return runtime.json_response(200, {
+        'services': services,
+        'total': len(positions) if include_total != 'none' else None,
+        'page': page,
+        'limit': limit
+    }, headers={'X-Snapshot-Version': str(SNAPSHOT.version)})
+
+
+@runtime.route(['GET'])
+@admission.guard()
+def handler(event, context):
+    '''API для получения списка услуг с фильтрацией'''
     
-    if search:
-        conditions.append('name ILIKE %s')
-        values.append(f'%{search}%')
+    if not SNAPSHOT_ENABLED:
+        return query_listing(event, context)
     
-    if conditions:
-        query += ' AND ' + ' AND '.join(conditions)
+    request, error = parse_request(event)
+    if error:
+        return error
     
-    count_query = f"SELECT COUNT(*) FROM ({query}) as filtered"
-    cur.execute(count_query, values)
-    total_count = cur.fetchone()[0]
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        return runtime.error(500, 'DATABASE_URL not configured')
+    
+    return snapshot_listing(dsn, *request)
+
+
+@cache.cached(RESPONSE_CACHE)
+def query_listing(event, context):
+    '''Прежний путь: фильтрация и страница запросом к БД'''
     
-    query += ' ORDER BY category, price LIMIT %s OFFSET %s'
-    values.extend([limit, offset])
+    request, error = parse_request(event)
+    if error:
+        return error
+    category, search, page, limit, include_total = request
     
-    cur.execute(query, values)
-    rows = cur.fetchall()
+    offset = (page - 1) * limit
     
-    services = []
-    for row in rows:
-        services.append({
-            'id': row[0],
-            'name': row[1],
-            'description': row[2],
-            'price': float(row[3]),
-            'category': row[4],
-            'duration': row[5]
-        })
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        return runtime.error(500, 'DATABASE_URL not configured')
     
-    cur.close()
-    conn.close()
+    with db.read_connection(dsn, STATEMENT_TIMEOUT_MS) as conn:
+        cur = conn.cursor()
+        
+        conditions, filter_values = build_filters(category, search)
+        filter_query = 'SELECT id FROM services WHERE ' + ' AND '.join(conditions)
+        query, values = page_query(conditions, filter_values, search, limit, offset,
+                                   with_total=include_total == 'exact')
+        
+        total_count = None
+        if include_total == 'estimate':
+            total_count = db.estimate_rows(cur, filter_query, filter_values)
+        
+        cur.execute(query, values)
+        rows = cur.fetchall()
+        
+        if include_total == 'exact':
+            if rows:
+                total_count = rows[0][6]
+            elif offset > 0:
+                total_count = db.count_rows(cur, filter_query, filter_values)
+            else:
+                total_count = 0
+        
+        services = []
+        for row in rows:
+            services.append({
+                'id': row[0],
+                'name': row[1],
+                'description': row[2],
+                'price': float(row[3]),
+                'category': row[4],
+                'duration': row[5]
+            })
+        
+        cur.close()
     
-    return {
-        'statusCode': 200,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({
-            'services': services,
-            'total': total_count,
-            'page': page,
-            'limit': limit
-        })
-    }
+    return runtime.json_response(200, {
+        'services': services,
+        'total': total_count,
+        'page': page,
+        'limit': limit
+    })
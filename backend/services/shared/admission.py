@@ -0,0 +1,116 @@
+import functools
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from . import db, runtime
+
+RATE_LIMIT_PER_SECOND = float(os.environ.get('RATE_LIMIT_PER_SECOND', '20'))
+RATE_LIMIT_BURST = float(os.environ.get('RATE_LIMIT_BURST', '40'))
+RATE_LIMIT_MAX_CLIENTS = int(os.environ.get('RATE_LIMIT_MAX_CLIENTS', '10000'))
+MAX_INFLIGHT_REQUESTS = int(os.environ.get('MAX_INFLIGHT_REQUESTS', '32'))
+MAX_PAGE = int(os.environ.get('MAX_PAGE', '1000'))
+OVERLOAD_RETRY_AFTER = 1
+
+SHED_HEADERS = {'Access-Control-Expose-Headers': 'Retry-After'}
+
+
+class TokenBucket:
+    '''Token bucket на ключ (IP клиента): rate токенов в секунду, не больше burst.
+
+    Хранится не больше max_keys ключей; давно не обращавшиеся вытесняются.
+    '''
+
+    def __init__(self, rate, burst, max_keys=RATE_LIMIT_MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        '''Списать токен; вернуть 0, если запрос пропущен, иначе секунды до следующего токена'''
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+def client_ip(event):
+    '''IP клиента из requestContext, проставленного шлюзом.
+
+    X-Forwarded-For не используется: клиент задаёт его сам и, меняя
+    значение, обходил бы свой token bucket.
+    '''
+    identity = (event.get('requestContext') or {}).get('identity') or {}
+    return identity.get('sourceIp') or 'unknown'
+
+
+def paging(params, default_limit, max_limit, max_page=MAX_PAGE):
+    '''Разобрать page/limit: limit ограничивается 1..max_limit; ValueError при нечисловых значениях и page вне 1..max_page'''
+    try:
+        page = int(params.get('page') or 1)
+        limit = int(params.get('limit') or default_limit)
+    except (TypeError, ValueError):
+        raise ValueError('page and limit must be integers')
+    if page < 1 or page > max_page:
+        raise ValueError(f'page must be between 1 and {max_page}; use cursor for deeper pages')
+    return page, max(1, min(limit, max_limit))
+
+
+def statement_timeout(function_name, default_ms):
+    '''statement_timeout функции из <FUNCTION>_STATEMENT_TIMEOUT_MS, по умолчанию default_ms'''
+    key = function_name.upper().replace('-', '_') + '_STATEMENT_TIMEOUT_MS'
+    return int(os.environ.get(key, str(default_ms)))
+
+
+def shed(status, message, retry_after):
+    return runtime.error(status, message, headers={**SHED_HEADERS, 'Retry-After': str(retry_after)})
+
+
+def guard(rate=RATE_LIMIT_PER_SECOND, burst=RATE_LIMIT_BURST, max_inflight=MAX_INFLIGHT_REQUESTS):
+    '''Допуск запроса к обработчику чтения.
+
+    429 — клиент превысил свой token bucket; 503 — процесс уже обслуживает
+    max_inflight запросов, пул соединений исчерпан или сработал
+    statement_timeout. Лишние запросы отклоняются сразу, а не ждут в очереди.
+    '''
+    bucket = TokenBucket(rate, burst)
+    inflight = threading.BoundedSemaphore(max_inflight)
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            wait = bucket.take(client_ip(event))
+            if wait > 0:
+                return shed(429, 'Too many requests', max(1, math.ceil(wait)))
+
+            if not inflight.acquire(blocking=False):
+                return shed(503, 'Server is overloaded', OVERLOAD_RETRY_AFTER)
+            try:
+                return handler(event, context)
+            except db.PoolExhausted:
+                return shed(503, 'Server is overloaded', OVERLOAD_RETRY_AFTER)
+            except Exception as e:
+                if db.is_query_canceled(e):
+                    return shed(503, 'Query timed out', OVERLOAD_RETRY_AFTER)
+                raise
+            finally:
+                inflight.release()
+
+        return wrapper
+
+    return decorator
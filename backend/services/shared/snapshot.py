@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+
+from . import db
+
+CHECK_INTERVAL_SECONDS = float(os.environ.get('SNAPSHOT_CHECK_INTERVAL', '30'))
+NOTIFY_CHANNEL = 'data_version'
+VERSION_QUERY = 'SELECT version FROM data_versions WHERE name = %s'
+
+
+class Listener:
+    '''LISTEN на отдельном autocommit-соединении.
+
+    Проверка уведомлений — неблокирующий poll() уже открытого сокета,
+    без запроса к серверу.
+    '''
+
+    def __init__(self, dsn, channel=NOTIFY_CHANNEL):
+        psycopg2 = db.driver()
+        self.conn = psycopg2.connect(dsn)
+        self.conn.autocommit = True
+        cur = self.conn.cursor()
+        cur.execute(f'LISTEN {channel}')
+        cur.close()
+
+    def pending(self):
+        '''payload полученных уведомлений; None, если соединение потеряно'''
+        psycopg2 = db.driver()
+        try:
+            self.conn.poll()
+        except psycopg2.Error:
+            self.close()
+            return None
+        payloads = {notify.payload for notify in self.conn.notifies}
+        del self.conn.notifies[:]
+        return payloads
+
+    def close(self):
+        if not self.conn.closed:
+            self.conn.close()
+
+
+class Snapshot:
+    '''Данные таблицы в памяти процесса, перечитываемые при смене версии в data_versions.
+
+    Смена версии замечается сразу по NOTIFY, если удалось подписаться, и
+    в любом случае не позже чем через check_interval секунд. load(cur)
+    строит данные из курсора в той же транзакции, где прочитана версия.
+    '''
+
+    def __init__(self, name, load, check_interval=CHECK_INTERVAL_SECONDS, listen=True):
+        self.name = name
+        self.load = load
+        self.check_interval = check_interval
+        self.listen = listen
+        self.data = None
+        self.version = None
+        self.checked_at = 0.0
+        self._listener = None
+        self._listen_retry_at = 0.0
+        self._lock = threading.Lock()
+        self._stats = {'loads': 0, 'checks': 0, 'notifications': 0}
+
+    def get(self, dsn):
+        with self._lock:
+            if self.listen and self._listener is None and time.monotonic() >= self._listen_retry_at:
+                self._start_listener(dsn)
+            if self.data is None or self._notified():
+                self._reload(dsn)
+            elif time.monotonic() - self.checked_at > self.check_interval:
+                self._check(dsn)
+            return self.data
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'version': self.version, 'listening': self._listener is not None}
+
+    def _start_listener(self, dsn):
+        psycopg2 = db.driver()
+        try:
+            self._listener = Listener(dsn)
+        except psycopg2.Error:
+            self._listen_retry_at = time.monotonic() + self.check_interval
+            return
+        # Изменения между прошлой загрузкой и подпиской могли пройти мимо
+        self.data = None
+
+    def _notified(self):
+        if self._listener is None:
+            return False
+        payloads = self._listener.pending()
+        if payloads is None:
+            self._listener = None
+            return True
+        if self.name in payloads:
+            self._stats['notifications'] += 1
+            return True
+        return False
+
+    def _reload(self, dsn):
+        with db.connection(dsn) as conn:
+            cur = conn.cursor()
+            cur.execute(VERSION_QUERY, (self.name,))
+            row = cur.fetchone()
+            data = self.load(cur)
+            cur.close()
+            conn.rollback()
+        self.data = data
+        self.version = row[0] if row else None
+        self.checked_at = time.monotonic()
+        self._stats['loads'] += 1
+
+    def _check(self, dsn):
+        with db.connection(dsn) as conn:
+            cur = conn.cursor()
+            cur.execute(VERSION_QUERY, (self.name,))
+            row = cur.fetchone()
+            cur.close()
+            conn.rollback()
+        self._stats['checks'] += 1
+        if (row[0] if row else None) != self.version:
+            self._reload(dsn)
+        else:
+            self.checked_at = time.monotonic()
@@ -0,0 +1,87 @@
+'''Копирование backend/shared/ в каталог каждой функции.
+
+Функция деплоится только из своего каталога backend/<function>/, поэтому
+пакет shared должен лежать рядом с её index.py. Исходник — backend/shared/,
+копии в функциях правятся только этим скриптом. С --check ничего не
+пишется: код возврата 1, если хоть одна копия отличается от исходника.
+
+Запуск: python backend/sync_shared.py [--check]
+'''
+import argparse
+import filecmp
+import os
+import shutil
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.join(BACKEND_DIR, 'shared')
+
+
+def function_dirs():
+    '''Каталоги функций, импортирующих пакет shared'''
+    for name in sorted(os.listdir(BACKEND_DIR)):
+        index_path = os.path.join(BACKEND_DIR, name, 'index.py')
+        if not os.path.isfile(index_path):
+            continue
+        with open(index_path, encoding='utf-8') as f:
+            if 'from shared import' in f.read():
+                yield os.path.join(BACKEND_DIR, name)
+
+
+def source_files():
+    return sorted(name for name in os.listdir(SOURCE_DIR) if name.endswith('.py'))
+
+
+def diff(target_dir):
+    '''Список расхождений копии с исходником: отсутствующие, изменённые и лишние файлы'''
+    expected = source_files()
+    problems = []
+    for name in expected:
+        target = os.path.join(target_dir, name)
+        if not os.path.isfile(target):
+            problems.append(f'missing {name}')
+        elif not filecmp.cmp(os.path.join(SOURCE_DIR, name), target, shallow=False):
+            problems.append(f'differs {name}')
+    if os.path.isdir(target_dir):
+        for name in sorted(os.listdir(target_dir)):
+            if name.endswith('.py') and name not in expected:
+                problems.append(f'extra {name}')
+    return problems
+
+
+def sync(target_dir):
+    os.makedirs(target_dir, exist_ok=True)
+    expected = source_files()
+    for name in os.listdir(target_dir):
+        if name.endswith('.py') and name not in expected:
+            os.remove(os.path.join(target_dir, name))
+    for name in expected:
+        shutil.copyfile(os.path.join(SOURCE_DIR, name), os.path.join(target_dir, name))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--check', action='store_true', help='только проверить, что копии совпадают с backend/shared/')
+    args = parser.parse_args()
+
+    stale = {}
+    for function_dir in function_dirs():
+        target_dir = os.path.join(function_dir, 'shared')
+        problems = diff(target_dir)
+        if not problems:
+            continue
+        if args.check:
+            stale[os.path.basename(function_dir)] = problems
+        else:
+            sync(target_dir)
+            print(f'synced {os.path.relpath(target_dir, BACKEND_DIR)}')
+
+    if stale:
+        for function_name, problems in stale.items():
+            print(f'{function_name}/shared: {", ".join(problems)}', file=sys.stderr)
+        print('run: python backend/sync_shared.py', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+CREATE INDEX IF NOT EXISTS idx_products_active_created_id ON products(created_at DESC, id DESC) WHERE is_active = true;
@@ -0,0 +1,12 @@
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (to_tsvector('russian', coalesce(name, ''))) STORED;
+
+ALTER TABLE services ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (to_tsvector('russian', coalesce(name, ''))) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_products_search_vector ON products USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_products_name_trgm ON products USING GIN (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_services_search_vector ON services USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_services_name_trgm ON services USING GIN (name gin_trgm_ops);
@@ -0,0 +1,18 @@
+CREATE MATERIALIZED VIEW IF NOT EXISTS catalog_facets AS
+SELECT 'category' AS facet, c.id, c.name, c.slug, c.icon,
+       COUNT(p.id) AS product_count, NULL::DECIMAL(10, 2) AS min_price, NULL::DECIMAL(10, 2) AS max_price
+FROM categories c
+LEFT JOIN products p ON p.category_id = c.id AND p.is_active = true
+GROUP BY c.id, c.name, c.slug, c.icon
+UNION ALL
+SELECT 'brand', b.id, b.name, NULL, NULL, COUNT(p.id), NULL, NULL
+FROM brands b
+LEFT JOIN products p ON p.brand_id = b.id AND p.is_active = true
+GROUP BY b.id, b.name
+HAVING COUNT(p.id) > 0
+UNION ALL
+SELECT 'price', 0, NULL, NULL, NULL, COUNT(*), MIN(price), MAX(price)
+FROM products
+WHERE is_active = true;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_catalog_facets_facet_id ON catalog_facets(facet, id);
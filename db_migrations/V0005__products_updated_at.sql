@@ -0,0 +1,22 @@
+UPDATE products SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL;
+ALTER TABLE products ALTER COLUMN updated_at SET NOT NULL;
+
+CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at = CURRENT_TIMESTAMP;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_products_updated_at ON products;
+CREATE TRIGGER trg_products_updated_at
+    BEFORE UPDATE ON products
+    FOR EACH ROW
+    WHEN ((OLD.name, OLD.slug, OLD.description, OLD.price, OLD.category_id, OLD.brand_id,
+           OLD.image_url, OLD.rating, OLD.specs, OLD.stock_quantity, OLD.is_active)
+          IS DISTINCT FROM
+          (NEW.name, NEW.slug, NEW.description, NEW.price, NEW.category_id, NEW.brand_id,
+           NEW.image_url, NEW.rating, NEW.specs, NEW.stock_quantity, NEW.is_active))
+    EXECUTE FUNCTION set_updated_at();
+
+CREATE INDEX IF NOT EXISTS idx_products_updated_id ON products(updated_at, id);
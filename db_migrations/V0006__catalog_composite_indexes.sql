@@ -0,0 +1,9 @@
+CREATE INDEX IF NOT EXISTS idx_products_active_category_created ON products(category_id, created_at DESC, id DESC) WHERE is_active = true;
+CREATE INDEX IF NOT EXISTS idx_products_active_brand_created ON products(brand_id, created_at DESC, id DESC) WHERE is_active = true;
+CREATE INDEX IF NOT EXISTS idx_products_active_price ON products(price, id) WHERE is_active = true;
+CREATE INDEX IF NOT EXISTS idx_services_active_category_price ON services(category, price) WHERE is_active = true;
+
+DROP INDEX IF EXISTS idx_products_active;
+
+ANALYZE products;
+ANALYZE services;
@@ -0,0 +1,8 @@
+UPDATE products SET rating = 0 WHERE rating IS NULL;
+ALTER TABLE products ALTER COLUMN rating SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_products_active_rating_id ON products(rating DESC, id DESC) WHERE is_active = true;
+CREATE INDEX IF NOT EXISTS idx_products_active_category_price ON products(category_id, price, id) WHERE is_active = true;
+CREATE INDEX IF NOT EXISTS idx_products_active_category_rating ON products(category_id, rating DESC, id DESC) WHERE is_active = true;
+
+ANALYZE products;
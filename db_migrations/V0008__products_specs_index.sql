@@ -0,0 +1 @@
+CREATE INDEX IF NOT EXISTS idx_products_specs ON products USING GIN (specs jsonb_path_ops);
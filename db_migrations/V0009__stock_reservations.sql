@@ -0,0 +1,7 @@
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS stock_reserved BOOLEAN NOT NULL DEFAULT false;
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS reserved_until TIMESTAMP;
+
+CREATE INDEX IF NOT EXISTS idx_orders_reserved_until ON orders(reserved_until) WHERE stock_reserved = true;
+CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items(order_id);
+
+ALTER TABLE products ADD CONSTRAINT products_stock_non_negative CHECK (stock_quantity >= 0) NOT VALID;
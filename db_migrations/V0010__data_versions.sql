@@ -0,0 +1,21 @@
+CREATE TABLE IF NOT EXISTS data_versions (
+    name VARCHAR(64) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO data_versions (name) VALUES ('services') ON CONFLICT (name) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_data_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE data_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = TG_TABLE_NAME;
+    PERFORM pg_notify('data_version', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_services_data_version ON services;
+CREATE TRIGGER trg_services_data_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON services
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_data_version();
@@ -0,0 +1,2 @@
+CREATE INDEX IF NOT EXISTS idx_orders_customer_email_created ON orders(customer_email, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items(order_id);
@@ -0,0 +1 @@
+INSERT INTO data_versions (name) VALUES ('catalog') ON CONFLICT (name) DO NOTHING;
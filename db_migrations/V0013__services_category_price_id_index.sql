@@ -0,0 +1,5 @@
+CREATE INDEX IF NOT EXISTS idx_services_active_category_price_id ON services(category, price, id) WHERE is_active = true;
+
+DROP INDEX IF EXISTS idx_services_active_category_price;
+
+ANALYZE services;